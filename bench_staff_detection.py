@@ -0,0 +1,140 @@
+import sys
+import time
+import cv2
+import numpy as np
+from src.staff_detection import DETECTION_DPI, PAGE_DPI, detect_staff_layout
+
+# Letter page at 300 DPI
+PAGE_WIDTH, PAGE_HEIGHT = 2550, 3300
+STAFF_SPACE = 22
+SYSTEM_SPACING = 330
+MARGIN = 150
+# Skewed scans checked on top of the straight pages (degrees)
+SKEW_ANGLES = (0.2, 0.5, 1.0)
+
+def _rotated_layout(systems, system_bars, rotation):
+    """
+    Maps a drawn layout through a page rotation, as bounding boxes: each
+    staff line's top edge and each barline's left edge.
+    """
+    def rotate(points):
+        return cv2.transform(np.array([points], dtype=float), rotation)[0]
+
+    left, right = MARGIN, PAGE_WIDTH - MARGIN
+    rotated_systems, rotated_bars = [], {}
+    for i, (top, bottom) in enumerate(systems):
+        rotated_systems.append(tuple(int(round(rotate([(left, y), (right, y)])[:, 1].min())) for y in (top, bottom)))
+        rotated_bars[i] = sorted(int(round(rotate([(x, top), (x, bottom)])[:, 0].min())) for x in system_bars[i])
+    return rotated_systems, rotated_bars
+
+def synthetic_page(num_systems=8, bars_per_system=4, seed=0, angle=0.0):
+    """
+    Draws a lead sheet page: 5-line staves, barlines, stemmed noteheads,
+    chord symbols above each staff and a full-height rule left of the staves
+    (like a scanned page edge), rotated by `angle` degrees like a skewed scan.
+    Returns the grayscale image and the true (systems, system_bars) layout.
+    """
+    rng = np.random.default_rng(seed)
+    page = np.full((PAGE_HEIGHT, PAGE_WIDTH), 255, dtype=np.uint8)
+    left, right = MARGIN, PAGE_WIDTH - MARGIN
+    systems, system_bars = [], {}
+    cv2.line(page, (MARGIN - 50, 100), (MARGIN - 50, PAGE_HEIGHT - 100), 0, 3)
+
+    for i in range(num_systems):
+        top = 300 + i * SYSTEM_SPACING
+        bottom = top + 4 * STAFF_SPACE
+        for line in range(5):
+            y = top + line * STAFF_SPACE
+            cv2.line(page, (left, y), (right, y), 0, 2)
+        systems.append((top, bottom))
+
+        bars = [int(x) for x in np.linspace(left, right - 3, bars_per_system + 1)]
+        for x in bars:
+            cv2.rectangle(page, (x, top), (x + 2, bottom), 0, -1)
+        system_bars[i] = bars
+
+        for b in range(bars_per_system):
+            # Chord symbols on beats 1 and 3
+            for beat in (0.05, 0.55):
+                x = int(bars[b] + beat * (bars[b + 1] - bars[b]))
+                cv2.putText(page, rng.choice(['Cm7', 'F7', 'Bbmaj7', 'Eb7#9', 'Am7b5']), (x, top - 40),
+                            cv2.FONT_HERSHEY_SIMPLEX, 1.6, 0, 3)
+            # Quarter notes from the ledger line below to the one above the
+            # staff, with engraved-length stems of 3.5 staff spaces
+            for q in range(4):
+                x = int(bars[b] + (q + 0.6) / 4.5 * (bars[b + 1] - bars[b]))
+                step = int(rng.integers(-2, 11))
+                y = int(top + step * STAFF_SPACE / 2)
+                cv2.ellipse(page, (x, y), (13, 9), -20, 0, 360, 0, -1)
+                if step < 4:
+                    cv2.line(page, (x - 12, y), (x - 12, y + 7 * STAFF_SPACE // 2), 0, 2)
+                else:
+                    cv2.line(page, (x + 12, y), (x + 12, y - 7 * STAFF_SPACE // 2), 0, 2)
+
+    if angle:
+        rotation = cv2.getRotationMatrix2D((PAGE_WIDTH / 2, PAGE_HEIGHT / 2), angle, 1.0)
+        page = cv2.warpAffine(page, rotation, (PAGE_WIDTH, PAGE_HEIGHT), flags=cv2.INTER_LINEAR, borderValue=255)
+        systems, system_bars = _rotated_layout(systems, system_bars, rotation)
+
+    # Light scanner noise
+    noise = rng.normal(0, 6, page.shape)
+    page = np.clip(page.astype(float) - np.abs(noise), 0, 255).astype(np.uint8)
+    return page, (systems, system_bars)
+
+def layouts_match(expected, found, tolerance):
+    """
+    True if both layouts have the same systems and barlines, with every
+    coordinate within `tolerance` pixels.
+    """
+    expected_systems, expected_bars = expected
+    systems, bars = found
+    if len(systems) != len(expected_systems):
+        return False
+    for (top, bottom), (exp_top, exp_bottom) in zip(systems, expected_systems):
+        if abs(top - exp_top) > tolerance or abs(bottom - exp_bottom) > tolerance:
+            return False
+    for i in range(len(systems)):
+        if len(bars.get(i, [])) != len(expected_bars.get(i, [])):
+            return False
+        if any(abs(x - exp_x) > tolerance for x, exp_x in zip(bars[i], expected_bars[i])):
+            return False
+    return True
+
+def time_detection(page, detection_dpi, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        layout = detect_staff_layout(page, PAGE_DPI, detection_dpi)
+    return layout, (time.perf_counter() - start) / repeats
+
+if __name__ == '__main__':
+    num_pages = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    repeats = 3
+    tolerance = 2 * PAGE_DPI // DETECTION_DPI
+
+    pages = [(seed, 0.0) for seed in range(num_pages)] + [(seed, angle) for seed, angle in enumerate(SKEW_ANGLES)]
+    full_total = coarse_total = 0.0
+    failures = 0
+    for seed, angle in pages:
+        page, truth = synthetic_page(seed=seed, angle=angle)
+        full, full_seconds = time_detection(page, None, repeats)
+        coarse, coarse_seconds = time_detection(page, DETECTION_DPI, repeats)
+        full_total += full_seconds
+        coarse_total += coarse_seconds
+
+        # The downsampled layout must reproduce the full-resolution one, and both the drawn truth
+        problems = [name for name, expected, found in (('coarse != full', full, coarse), ('full != truth', truth, full),
+                                                       ('coarse != truth', truth, coarse))
+                    if not layouts_match(expected, found, tolerance)]
+        ok = not problems
+        failures += not ok
+        print(f"page {seed}{f' at {angle:g} deg' if angle else ''}: {len(coarse[0])} systems, {sum(len(b) for b in coarse[1].values())} barlines "
+              f"({sum(len(b) for b in full[1].values())} at full resolution, {sum(len(b) for b in truth[1].values())} drawn), "
+              f"full {full_seconds * 1000:.1f} ms, {DETECTION_DPI} DPI {coarse_seconds * 1000:.1f} ms "
+              f"{'OK' if ok else 'MISMATCH: ' + ', '.join(problems)}")
+        if not ok:
+            print(f"  truth:  {truth}\n  full:   {full}\n  coarse: {coarse}")
+
+    print(f"\nFull resolution: {full_total / len(pages) * 1000:.1f} ms/page, "
+          f"{DETECTION_DPI} DPI: {coarse_total / len(pages) * 1000:.1f} ms/page "
+          f"({full_total / coarse_total:.1f}x faster), {failures} mismatched pages")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,189 @@
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+from src.batch import MIDI_EXTENSIONS, run_parallel
+from src.ground_truth import MAKO_SUFFIX
+DEFAULT_OPENBOOK_DIR = 'data/openbook/src/openbook'
+
+def pair_corpus(midi_dir, openbook_dir=DEFAULT_OPENBOOK_DIR):
+    """
+    Pairs each MIDI file under midi_dir with the openbook tune whose name is
+    the longest prefix of the MIDI file name, e.g. autumn_leaves_bushgrafts.mid
+    -> autumn_leaves.ly.mako. Names are matched case-insensitively.
+    Returns a sorted list of (midi path, mako path).
+    """
+    tunes = {f[:-len(MAKO_SUFFIX)].lower(): os.path.join(openbook_dir, f)
+             for f in os.listdir(openbook_dir) if f.endswith(MAKO_SUFFIX)}
+    pairs = []
+    for root, _, files in os.walk(midi_dir):
+        for filename in files:
+            if not filename.lower().endswith(MIDI_EXTENSIONS):
+                continue
+            stem = os.path.splitext(filename)[0].lower()
+            matches = [t for t in tunes if stem == t or stem.startswith(t + '_') or stem.startswith(t + '-')]
+            if matches:
+                pairs.append((os.path.join(root, filename), tunes[max(matches, key=len)]))
+    return sorted(pairs)
+
+def read_manifest(path):
+    """
+    Reads '<midi path> <mako path>' pairs, one per line (paths relative to
+    the manifest; blank lines and # comments ignored).
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    pairs = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            midi, mako = line.split()[:2]
+            pairs.append(tuple(p if os.path.isabs(p) else os.path.join(base, p) for p in (midi, mako)))
+    return pairs
+
+def _evaluate(item, cache_dir=None, beats_per_chord=2.0, window_size=16.0, loader='mido'):
+    """
+    Scores one (midi path, mako path, ground truth symbols or None) item.
+    """
+    from src.accuracy_tester import evaluate_accuracy
+    from src.cache import DiskCache
+
+    midi_path, mako_path, ground_truth = item
+    cache = DiskCache(cache_dir) if cache_dir else None
+    result = evaluate_accuracy(midi_path, mako_path, cache=cache, beats_per_chord=beats_per_chord,
+                               window_size=window_size, loader=loader, ground_truth=ground_truth, raise_errors=True)
+    if result is None:
+        raise ValueError("no pitched notes found")
+    if not result['ground_truth']:
+        raise ValueError("no ground truth chords found")
+    return result
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def summarize(records):
+    """
+    Aggregates per-tune records into corpus metrics: micro-averaged accuracies
+    (over all compared chords), macro averages (mean of per-tune accuracies)
+    and total/mean/max seconds per pipeline stage.
+    """
+    ok = [r for r in records if r['status'] == 'ok']
+    totals = {}
+    for r in ok:
+        for name, value in r['counts'].items():
+            if name == 'alignment':
+                alignment = totals.setdefault('alignment', {})
+                for match_type, n in value.items():
+                    alignment[match_type] = alignment.get(match_type, 0) + n
+            else:
+                totals[name] = totals.get(name, 0) + value
+
+    metrics = {}
+    for name in ('symbol', 'root', 'quality'):
+        metrics[f"{name}_accuracy"] = totals[name] / totals['compared'] if totals.get('compared') else 0.0
+        metrics[f"macro_{name}_accuracy"] = sum(r['metrics'][f"{name}_accuracy"] for r in ok) / len(ok) if ok else 0.0
+
+    timings = {}
+    for r in ok:
+        for stage, seconds in r['timings'].items():
+            timings.setdefault(stage, []).append(seconds)
+    timings = {stage: {'total': sum(v), 'mean': sum(v) / len(v), 'max': max(v)} for stage, v in timings.items()}
+    return metrics, totals, timings
+
+def load_ground_truth(pairs, store_path, version='ChordsReal'):
+    """
+    Refreshes the compiled ground truth store for the pairs' .ly.mako files
+    and loads all of their chords in one query. Returns {midi path: [symbols]}.
+    """
+    from src.ground_truth import GroundTruthStore
+
+    with GroundTruthStore(store_path) as store:
+        store.update_files(set(mako for _, mako in pairs))
+        symbols = store.load_all(version)
+    return {midi: symbols.get(os.path.abspath(mako), []) for midi, mako in pairs}
+
+def run_benchmark(pairs, output_path, workers=None, chunk_size=4, timeout=300.0,
+                  beats_per_chord=2.0, window_size=16.0, cache_dir=None, store_path=None, loader='mido'):
+    """
+    Scores every (midi, mako) pair in parallel and writes a JSON report with
+    corpus metrics, stage timings, throughput and the per-tune results.
+    With store_path, ground truth comes from a GroundTruthStore instead of
+    re-parsing the .ly.mako files in every worker. The fast mido loader is
+    the default; scores can differ slightly from accuracy_tester, whose
+    music21 loader splits notes at barlines. Returns the report.
+    """
+    start = time.perf_counter()
+    ground_truth = load_ground_truth(pairs, store_path) if store_path else {}
+    # Each work item carries its own ground truth, so chunks only pickle what they score
+    items = [(midi, mako, ground_truth.get(midi)) for midi, mako in pairs]
+    records = []
+    for record in run_parallel(_evaluate, items, workers=workers, chunk_size=chunk_size, timeout=timeout,
+                               cache_dir=cache_dir, beats_per_chord=beats_per_chord, window_size=window_size,
+                               loader=loader):
+        records.append(record)
+        if record['status'] == 'ok':
+            print(f"[{len(records)}/{len(pairs)}] {os.path.basename(record['file'])}: "
+                  f"{record['metrics']['symbol_accuracy']:.1%} symbols")
+        else:
+            print(f"[{len(records)}/{len(pairs)}] {os.path.basename(record['file'])}: {record['status']} ({record.get('error')})")
+    wall_seconds = time.perf_counter() - start
+
+    metrics, counts, timings = summarize(records)
+    report = {
+        'commit': _git_commit(),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'settings': {'beats_per_chord': beats_per_chord, 'window_size': window_size, 'loader': loader,
+                     'workers': workers, 'cache': cache_dir is not None},
+        'files': len(records),
+        'failed': sum(r['status'] != 'ok' for r in records),
+        'wall_seconds': wall_seconds,
+        'files_per_second': len(records) / wall_seconds if wall_seconds else 0.0,
+        'metrics': metrics,
+        'counts': counts,
+        'timings': timings,
+        'tunes': sorted(records, key=lambda r: r['file']),
+    }
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+if __name__ == '__main__':
+    from src.cache import DEFAULT_CACHE_DIR, LOADERS
+
+    parser = argparse.ArgumentParser(description="Score the MIDI pipeline against the openbook ground truth.")
+    parser.add_argument('source', help="directory of MIDI files, or a manifest of '<midi> <mako>' lines")
+    parser.add_argument('--openbook', default=DEFAULT_OPENBOOK_DIR, help="directory of .ly.mako files")
+    parser.add_argument('-o', '--output', default='accuracy_report.json')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=300.0, help="per-file timeout in seconds")
+    parser.add_argument('--beats-per-chord', type=float, default=2.0)
+    parser.add_argument('--window-size', type=float, default=16.0)
+    parser.add_argument('--loader', choices=LOADERS, default='mido', help="note loader (music21 matches accuracy_tester)")
+    parser.add_argument('--store', help="compiled ground truth store (default: ground_truth.db in the cache directory)")
+    parser.add_argument('--no-cache', action='store_true', help="disable the disk cache and the ground truth store")
+    args = parser.parse_args()
+
+    pairs = pair_corpus(args.source, args.openbook) if os.path.isdir(args.source) else read_manifest(args.source)
+    if not pairs:
+        print(f"No MIDI files with matching ground truth found in {args.source}")
+        sys.exit(1)
+
+    report = run_benchmark(pairs, args.output, workers=args.workers, chunk_size=args.chunk_size,
+                           timeout=args.timeout, beats_per_chord=args.beats_per_chord, window_size=args.window_size,
+                           loader=args.loader,
+                           cache_dir=None if args.no_cache else DEFAULT_CACHE_DIR,
+                           store_path=None if args.no_cache else args.store or os.path.join(DEFAULT_CACHE_DIR, 'ground_truth.db'))
+    metrics = report['metrics']
+    print(f"\nScored {report['files'] - report['failed']}/{report['files']} tunes in {report['wall_seconds']:.1f}s "
+          f"({report['files_per_second']:.2f} files/s)")
+    print(f"Symbol accuracy: {metrics['symbol_accuracy']:.1%}  Root: {metrics['root_accuracy']:.1%}  "
+          f"Quality: {metrics['quality_accuracy']:.1%}")
+    print(f"Report written to {args.output}")
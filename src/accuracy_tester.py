@@ -1,73 +1,166 @@
-from src.source import load_midi
-from src.parse import quantize_harmony
+from src.alignment import align_symbols
+from src.cache import DiskCache, load_notes, quantize_timeline
+from src.chord_symbols import compare_symbols
 from src.ground_truth import parse_lilypond_chords
+from src.parse import DEFAULT_SHIFT, DEFAULT_START_OFFSET
+from src.keymap import KeyMap
 from music21 import harmony
 import sys
 import os
+import time
 
-def test_accuracy(midi_file, mako_file):
-    print(f"--- Accuracy Test: {os.path.basename(midi_file)} ---")
-    
-    # 1. Get Ground Truth
-    ground_truth = parse_lilypond_chords(mako_file)
-    print(f"Ground Truth Chords: {len(ground_truth)}")
-    print(" ".join(ground_truth[:12]) + " ...")
-    
-    # 2. Run Pipeline
-    score = load_midi(midi_file)
-    if not score or len(score.parts) == 0:
-        print("Failed to load MIDI.")
-        return
-        
-    print(f"\\nAnalyzing MIDI ({len(score.parts)} tracks)...")
-    quantized_part = quantize_harmony(score, beats_per_chord=2.0)
-    
-    # Run the full analysis pipeline so context-aware heuristics are applied
+def score_symbols(ground_truth, analyzed_chords, alignment=None):
+    """
+    Aligns the analyzed chord symbols to the ground truth and counts, over
+    all ground truth chords, exact symbol, root and quality family matches.
+    Ground truth chords left unaligned count as misses. The alignment's
+    match type counts are kept under 'alignment'.
+    """
+    if alignment is None:
+        alignment = align_symbols(ground_truth, analyzed_chords)
+    counts = {'ground_truth': len(ground_truth), 'analyzed': len(analyzed_chords), 'compared': len(ground_truth),
+              'symbol': 0, 'root': 0, 'quality': 0}
+    for truth_index, analyzed_index, match_type in alignment:
+        if truth_index is None or analyzed_index is None:
+            continue
+        same_symbol, same_root, same_quality = compare_symbols(ground_truth[truth_index], analyzed_chords[analyzed_index])
+        counts['symbol'] += same_symbol
+        counts['root'] += same_root
+        counts['quality'] += same_quality
+    counts['alignment'] = alignment.counts()
+    return counts
+
+def accuracy_metrics(counts):
+    compared = counts['compared']
+    return {f"{name}_accuracy": counts[name] / compared if compared else 0.0 for name in ('symbol', 'root', 'quality')}
+
+def analyze_symbols(quantized_part, window_size=16.0, timings=None):
+    """
+    Runs key detection and progression analysis on a quantized Part and
+    names every chord. Returns (chord symbols, global key). Stage times are
+    added to `timings` when given.
+    """
     from src.analyze import detect_local_keys, analyze_progression, guess_jazz_chord
+    timings = timings if timings is not None else {}
+
+    # Run the full analysis pipeline so context-aware heuristics are applied
+    start = time.perf_counter()
+    global_key = None
     try:
-        local_keys, global_key = detect_local_keys(quantized_part, window_size=16.0)
+        local_keys, global_key = detect_local_keys(quantized_part, window_size=window_size)
         chords = list(quantized_part.getElementsByClass('Chord'))
         # This function modifies the chords in place to fix rootless voicings
-        analyze_progression(chords, local_keys, window_size=16.0)
+        analyze_progression(chords, local_keys, window_size=window_size)
     except Exception as e:
         print(f"Analysis failed: {e}")
         chords = list(quantized_part.getElementsByClass('Chord'))
-        local_keys = {0.0: global_key} if 'global_key' in locals() else {}
-    
+        local_keys = KeyMap([0.0], [global_key]) if global_key is not None else None
+    timings['analyze'] = time.perf_counter() - start
+
     # Extract chords from pipeline
+    start = time.perf_counter()
     analyzed_chords = []
-    
-    for c in chords:
-        window_start = (c.offset // 16.0) * 16.0
-        current_key = local_keys.get(window_start, list(local_keys.values())[0] if local_keys else None)
-        
+    chord_keys = local_keys.keys_at([float(c.offset) for c in chords]) if local_keys else [None] * len(chords)
+
+    for c, current_key in zip(chords, chord_keys):
         # Use our new intelligent jazz chord guesser
         symbol = guess_jazz_chord(c, current_key) if current_key else "?"
         analyzed_chords.append(symbol)
-            
+    timings['symbols'] = time.perf_counter() - start
+    return analyzed_chords, global_key
+
+def evaluate_accuracy(midi_file, mako_file, cache=None, beats_per_chord=2.0, window_size=16.0, ground_truth=None,
+                      shift=DEFAULT_SHIFT, start_offset=DEFAULT_START_OFFSET, loader='music21', raise_errors=False):
+    """
+    Runs the MIDI pipeline on midi_file and scores its chord symbols against
+    the openbook ground truth in mako_file (or against the precompiled
+    `ground_truth` symbol list, see GroundTruthStore). Returns a dictionary with both
+    chord lists, match counts, accuracies and per-stage timings (seconds),
+    or None if the MIDI could not be loaded (with raise_errors, the loader's
+    error propagates instead).
+    `loader` picks the note loader (see cache.LOADERS); the default music21
+    loader gives the same chords as parsing with load_midi.
+    """
+    timings = {}
+
+    # 1. Get Ground Truth
+    start = time.perf_counter()
+    if ground_truth is None:
+        ground_truth = parse_lilypond_chords(mako_file)
+    timings['ground_truth'] = time.perf_counter() - start
+
+    # 2. Run Pipeline (loading and quantization are served from the cache when possible)
+    start = time.perf_counter()
+    notes = load_notes(midi_file, cache, loader=loader, raise_errors=raise_errors)
+    timings['load'] = time.perf_counter() - start
+    if notes is None or len(notes) == 0:
+        return None
+
+    start = time.perf_counter()
+    quantized_part = quantize_timeline(midi_file, beats_per_chord=beats_per_chord, cache=cache, notes=notes,
+                                       shift=shift, start_offset=start_offset, loader=loader).to_part()
+    timings['quantize'] = time.perf_counter() - start
+
+    analyzed_chords, global_key = analyze_symbols(quantized_part, window_size, timings)
+
+    # 3. Align and compare
+    start = time.perf_counter()
+    alignment = align_symbols(ground_truth, analyzed_chords)
+    counts = score_symbols(ground_truth, analyzed_chords, alignment)
+    timings['align'] = time.perf_counter() - start
+    return {
+        'midi': midi_file,
+        'mako': mako_file,
+        'global_key': str(global_key) if global_key is not None else None,
+        'num_tracks': len(set(notes.program.tolist())),
+        'ground_truth': ground_truth,
+        'analyzed': analyzed_chords,
+        'alignment': [list(pair) for pair in alignment],
+        'match_types': alignment.truth_match_types(len(ground_truth)),
+        'counts': counts,
+        'metrics': accuracy_metrics(counts),
+        'timings': timings,
+    }
+
+def test_accuracy(midi_file, mako_file, cache=None):
+    print(f"--- Accuracy Test: {os.path.basename(midi_file)} ---")
+
+    result = evaluate_accuracy(midi_file, mako_file, cache=cache)
+    if result is None:
+        print("Failed to load MIDI.")
+        return None
+
+    ground_truth, analyzed_chords = result['ground_truth'], result['analyzed']
+    print(f"Ground Truth Chords: {len(ground_truth)}")
+    print(" ".join(ground_truth[:12]) + " ...")
+    print(f"\nAnalyzing MIDI ({result['num_tracks']} tracks)...")
     print(f"Analyzed Chords (2-beat buckets): {len(analyzed_chords)}")
-    
-    # 3. Simple Alignment & Comparison
-    print("\\n--- Comparison (First 20 Chords) ---")
-    print(f"{'Ground Truth':<20} | {'Analyzed Output':<20}")
-    print("-" * 45)
-    
-    for i in range(min(20, len(ground_truth), len(analyzed_chords))):
-        gt = ground_truth[i]
-        an = analyzed_chords[i]
-        
-        match = "Y" if gt == an else "N"
-        print(f"{gt:<20} | {an:<20} {match}")
+
+    print("\n--- Alignment (First 20 Pairs) ---")
+    print(f"{'Ground Truth':<20} | {'Analyzed Output':<20} | Match")
+    print("-" * 56)
+
+    for truth_index, analyzed_index, match_type in result['alignment'][:20]:
+        gt = ground_truth[truth_index] if truth_index is not None else '-'
+        an = analyzed_chords[analyzed_index] if analyzed_index is not None else '-'
+        print(f"{gt:<20} | {an:<20} | {match_type}")
+
+    metrics = result['metrics']
+    print(f"\nSymbol accuracy: {metrics['symbol_accuracy']:.1%}  Root: {metrics['root_accuracy']:.1%}  "
+          f"Quality: {metrics['quality_accuracy']:.1%}")
+    return result
 
 if __name__ == '__main__':
-    if len(sys.argv) < 3:
-        print("Usage: python src/accuracy_tester.py <midi_file> <mako_file>")
+    use_cache = '--no-cache' not in sys.argv
+    args = [a for a in sys.argv[1:] if a != '--no-cache']
+    if len(args) < 2:
+        print("Usage: python src/accuracy_tester.py <midi_file> <mako_file> [--no-cache]")
         # Fallback to defaults if no args provided
         midi = "data/autumn_leaves_bushgrafts.mid"
         mako = "data/openbook/src/openbook/autumn_leaves.ly.mako"
         print(f"No arguments provided. Running default test: {midi}")
     else:
-        midi = sys.argv[1]
-        mako = sys.argv[2]
+        midi = args[0]
+        mako = args[1]
         
-    test_accuracy(midi, mako)
+    test_accuracy(midi, mako, cache=DiskCache() if use_cache else None)
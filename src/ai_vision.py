@@ -4,6 +4,9 @@ from google import genai
 from google.genai import types
 from pydantic import BaseModel, Field
 
+# Model used for chord extraction (part of the OCR/AI result cache key)
+AI_MODEL = 'gemini-2.5-pro'
+
 class ChordExtraction(BaseModel):
     chord_symbol: str = Field(description="The jazz chord symbol, e.g. Eb7#9, Abm11")
     horizontal_percentage: float = Field(description="Estimated horizontal position from left to right (0.0 to 1.0)")
@@ -11,10 +14,24 @@ class ChordExtraction(BaseModel):
 class ChordList(BaseModel):
     chords: list[ChordExtraction]
 
-def extract_chords_with_ai(image_path):
+def _image_part(image):
+    """
+    Encodes an in-memory image (a NumPy array or PNG bytes) as an inline
+    request part, so nothing has to be written to disk or uploaded.
+    """
+    if not isinstance(image, (bytes, bytearray)):
+        import cv2
+        ok, encoded = cv2.imencode('.png', image)
+        if not ok:
+            raise ValueError("Could not encode image as PNG")
+        image = encoded.tobytes()
+    return types.Part.from_bytes(data=bytes(image), mime_type='image/png')
+
+def extract_chords_with_ai(image):
     """
     Uses Gemini Vision to extract jazz chord symbols and their relative positions
-     from a staff system image snippet.
+     from a staff system image snippet, given as a file path, a NumPy array
+     or PNG bytes.
     """
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
@@ -23,8 +40,13 @@ def extract_chords_with_ai(image_path):
 
     client = genai.Client(api_key=api_key)
     
-    # Upload the slice
-    uploaded_file = client.files.upload(file=image_path)
+    # Upload the slice if it is a file; in-memory images are sent inline
+    uploaded_file = None
+    if isinstance(image, (str, os.PathLike)):
+        uploaded_file = client.files.upload(file=image)
+        image_content = uploaded_file
+    else:
+        image_content = _image_part(image)
 
     prompt = (
         "You are an expert jazz musician. Look at this snippet of a lead sheet staff. "
@@ -36,8 +58,8 @@ def extract_chords_with_ai(image_path):
 
     try:
         response = client.models.generate_content(
-            model='gemini-2.5-pro',
-            contents=[uploaded_file, prompt],
+            model=AI_MODEL,
+            contents=[image_content, prompt],
             config=types.GenerateContentConfig(
                 response_mime_type="application/json",
                 response_schema=ChordList,
@@ -49,11 +71,12 @@ def extract_chords_with_ai(image_path):
         data = ChordList.model_validate_json(response.text)
         return data.chords
     except Exception as e:
-        print(f"AI Extraction failed for {image_path}: {e}")
+        print(f"AI Extraction failed for {image if uploaded_file else 'in-memory image'}: {e}")
         return []
     finally:
         # Cleanup file from Google Cloud
-        try:
-            client.files.delete(name=uploaded_file.name)
-        except:
-            pass
+        if uploaded_file is not None:
+            try:
+                client.files.delete(name=uploaded_file.name)
+            except:
+                pass
@@ -0,0 +1,135 @@
+import numpy as np
+from src.chord_symbols import parse_symbol
+
+# Match types, from best to worst; 'missing' and 'extra' are gaps.
+# 'root_quality' is the same root and quality family with a different suffix,
+# 'quality' the same quality family on another root (as in compare_symbols)
+MATCH_TYPES = ('exact', 'root_quality', 'root', 'quality', 'substitution', 'missing', 'extra')
+_EXACT, _ROOT_QUALITY, _ROOT, _QUALITY, _SUBSTITUTION, _MISSING, _EXTRA = range(len(MATCH_TYPES))
+
+# Substitution scores for each pairing type, and the cost of leaving a chord unaligned
+DEFAULT_SCORES = {'exact': 2.0, 'root_quality': 1.0, 'root': 0.5, 'quality': 0.0, 'substitution': -1.0}
+DEFAULT_GAP = -1.0
+
+# Traceback moves
+_DIAGONAL, _UP, _LEFT = 0, 1, 2
+
+def _symbol_codes(symbols):
+    """
+    Parses symbols into integer arrays (root pc, suffix id, quality id);
+    unparseable symbols get -1, which never matches anything.
+    """
+    ids = {}
+    roots, suffixes, qualities = [], [], []
+    for symbol in symbols:
+        root, suffix, quality, _ = parse_symbol(symbol)
+        if root is None:
+            roots.append(-1)
+            suffixes.append(-1)
+            qualities.append(-1)
+            continue
+        roots.append(root)
+        suffixes.append(ids.setdefault(('suffix', suffix), len(ids)))
+        qualities.append(ids.setdefault(('quality', quality), len(ids)))
+    return np.array(roots, dtype=int), np.array(suffixes, dtype=int), np.array(qualities, dtype=int)
+
+def pair_types(truth, analyzed):
+    """
+    Returns the (len(truth), len(analyzed)) matrix of pairing types
+    (indices into MATCH_TYPES) between two lists of chord symbols.
+    """
+    codes = _symbol_codes(list(truth) + list(analyzed))
+    n = len(truth)
+    truth_roots, truth_suffixes, truth_qualities = (c[:n, None] for c in codes)
+    roots, suffixes, qualities = (c[None, n:] for c in codes)
+
+    known = truth_roots >= 0
+    same_root = known & (truth_roots == roots)
+    same_quality = known & (truth_qualities == qualities)
+    same_symbol = same_root & same_quality & (truth_suffixes == suffixes)
+    return np.select([same_symbol, same_root & same_quality, same_root, same_quality],
+                     [_EXACT, _ROOT_QUALITY, _ROOT, _QUALITY], _SUBSTITUTION)
+
+class Alignment:
+    """
+    Global alignment of ground-truth chords against analyzed chords.
+    `pairs` lists (truth index, analyzed index, match type) in order, with
+    None on the gap side of 'missing' (truth chord with no analyzed chord)
+    and 'extra' (analyzed chord with no truth chord) entries.
+    """
+    __slots__ = ('pairs', 'score')
+
+    def __init__(self, pairs, score):
+        self.pairs = pairs
+        self.score = score
+
+    def __len__(self):
+        return len(self.pairs)
+
+    def __iter__(self):
+        return iter(self.pairs)
+
+    def counts(self):
+        counts = {name: 0 for name in MATCH_TYPES}
+        for _, _, match_type in self.pairs:
+            counts[match_type] += 1
+        return counts
+
+    def truth_match_types(self, num_truth):
+        """
+        Returns the match type of each ground-truth chord, in order.
+        """
+        types = ['missing'] * num_truth
+        for truth_index, _, match_type in self.pairs:
+            if truth_index is not None:
+                types[truth_index] = match_type
+        return types
+
+def align_symbols(truth, analyzed, scores=None, gap=DEFAULT_GAP):
+    """
+    Needleman-Wunsch global alignment of two chord symbol sequences, scoring
+    each pairing by its match type (see DEFAULT_SCORES) and each unaligned
+    chord with `gap`. The DP matrix is filled one anti-diagonal at a time:
+    every cell on diagonal i + j = d only depends on diagonals d-1 and d-2,
+    so each diagonal is a single vectorized NumPy update.
+    """
+    scores = dict(DEFAULT_SCORES, **(scores or {}))
+    n, m = len(truth), len(analyzed)
+    types = pair_types(truth, analyzed) if n and m else np.zeros((n, m), dtype=int)
+    type_scores = np.array([scores[name] for name in MATCH_TYPES[:_MISSING]])
+    substitution = type_scores[types]
+
+    H = np.zeros((n + 1, m + 1))
+    H[:, 0] = gap * np.arange(n + 1)
+    H[0, :] = gap * np.arange(m + 1)
+    moves = np.empty((n + 1, m + 1), dtype=np.int8)
+    moves[:, 0] = _UP
+    moves[0, :] = _LEFT
+
+    for d in range(2, n + m + 1):
+        i = np.arange(max(1, d - m), min(n, d - 1) + 1)
+        j = d - i
+        candidates = np.stack((H[i - 1, j - 1] + substitution[i - 1, j - 1],
+                               H[i - 1, j] + gap,
+                               H[i, j - 1] + gap))
+        best = candidates.argmax(axis=0)
+        H[i, j] = candidates[best, np.arange(len(i))]
+        moves[i, j] = best
+
+    # Trace back from the bottom-right corner
+    pairs = []
+    i, j = n, m
+    while i > 0 or j > 0:
+        move = moves[i, j]
+        if i > 0 and j > 0 and move == _DIAGONAL:
+            i -= 1
+            j -= 1
+            pairs.append((i, j, MATCH_TYPES[types[i, j]]))
+        elif i > 0 and (j == 0 or move == _UP):
+            i -= 1
+            pairs.append((i, None, 'missing'))
+        else:
+            j -= 1
+            pairs.append((None, j, 'extra'))
+    pairs.reverse()
+    return Alignment(pairs, float(H[n, m]))
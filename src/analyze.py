@@ -1,4 +1,14 @@
+import json
+import os
+import tempfile
+from collections import OrderedDict
+import numpy as np
 from music21 import roman, chord, key as music21_key
+from src.pcset import chord_mask, pitch_class_mask
+from src.chord_templates import match_chord_templates
+from src.timeline import ChordTimeline
+from src.keymap import KeyMap
+from src.patterns import find_progressions
 
 def detect_key(score):
     """
@@ -12,50 +22,256 @@ def detect_key(score):
         # Default to C Major if analysis fails
         return music21_key.Key('C')
 
-def detect_local_keys(quantized_stream, window_size=16.0):
+# Aarden-Essen key profiles (the music21 default for analyze('key')), indexed from the tonic
+_MAJOR_PROFILE = np.array([17.7661, 0.145624, 14.9265, 0.160186, 19.8049, 11.3587,
+                           0.291248, 22.062, 0.145624, 8.15494, 0.232998, 4.95122])
+_MINOR_PROFILE = np.array([18.2648, 0.737619, 14.0499, 16.8599, 0.702494, 14.4362,
+                           0.702494, 18.6161, 4.56621, 1.93186, 7.37619, 1.75623])
+
+# Tonic spellings music21 prefers for each pitch class
+_MAJOR_TONICS = ['C', 'C#', 'D', 'E-', 'E', 'F', 'F#', 'G', 'A-', 'A', 'B-', 'B']
+_MINOR_TONICS = ['C', 'C#', 'D', 'E-', 'E', 'F', 'F#', 'G', 'G#', 'A', 'B-', 'B']
+
+def _key_profile_matrix():
+    """
+    Returns the 24 mean-centred, unit-norm key profiles as rows:
+    major keys on tonics 0-11 followed by minor keys on tonics 0-11.
+    """
+    rows = [np.roll(profile, tonic) for profile in (_MAJOR_PROFILE, _MINOR_PROFILE) for tonic in range(12)]
+    profiles = np.array(rows)
+    profiles -= profiles.mean(axis=1, keepdims=True)
+    return profiles / np.linalg.norm(profiles, axis=1, keepdims=True)
+
+_KEY_PROFILES = _key_profile_matrix()
+
+def _score_keys(histograms):
+    """
+    Correlates every pitch-class histogram row with all 24 key profiles
+    in a single matrix multiply. Returns an (n, 24) correlation matrix.
+    """
+    centred = histograms - histograms.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(centred, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (centred / norms) @ _KEY_PROFILES.T
+
+def _key_from_index(index, correlation):
+    if index < 12:
+        k = music21_key.Key(_MAJOR_TONICS[index], 'major')
+    else:
+        k = music21_key.Key(_MINOR_TONICS[index - 12], 'minor')
+    k.correlationCoefficient = float(correlation)
+    return k
+
+def key_to_index(key_obj):
+    """
+    Maps a music21 Key to its row in the key profile matrix:
+    0-11 for major keys and 12-23 for minor keys, by tonic pitch class.
+    """
+    return key_obj.tonic.pitchClass + (12 if key_obj.mode == 'minor' else 0)
+
+def _note_weights(quantized_stream):
+    """
+    Returns onset-sorted offsets and duration-weighted pitch-class rows for
+    every note or chord of a stream or ChordTimeline.
+    """
+    if isinstance(quantized_stream, ChordTimeline):
+        onsets = quantized_stream.offsets
+        bits = (quantized_stream.pc_mask[:, None] >> np.arange(12)) & 1
+        weights = bits * quantized_stream.durations[:, None]
+    else:
+        rows = []
+        for el in quantized_stream.flatten().notes:
+            row = np.zeros(13)
+            row[0] = float(el.offset)
+            for p in el.pitches:
+                row[1 + p.pitchClass] += float(el.duration.quarterLength)
+            rows.append(row)
+        data = np.array(rows).reshape(-1, 13)
+        onsets, weights = data[:, 0], data[:, 1:]
+    order = np.argsort(onsets, kind='stable')
+    return onsets[order], weights[order]
+
+def _sliding_histograms(onsets, weights, window_starts, window_size):
+    """
+    Slides a window over onset-sorted notes, keeping a running duration-weighted
+    pitch-class histogram: notes are added as they enter the window and
+    subtracted as they leave. Like getElementsByOffset, a note belongs to
+    a window when its offset lies in [start, start + window_size].
+    Returns the (n, 12) histograms and the number of notes in each window.
+    """
+    histograms = np.zeros((len(window_starts), 12))
+    counts = np.zeros(len(window_starts), dtype=int)
+    running = np.zeros(12)
+    entering = leaving = 0
+    for w, start in enumerate(window_starts):
+        while entering < len(onsets) and onsets[entering] <= start + window_size:
+            running += weights[entering]
+            entering += 1
+        while leaving < entering and onsets[leaving] < start:
+            running -= weights[leaving]
+            leaving += 1
+        histograms[w] = running
+        counts[w] = entering - leaving
+    return histograms, counts
+
+def detect_local_keys(quantized_stream, window_size=16.0, hop_size=None):
     """
     Uses a sliding window to detect local key centers across the timeline.
-    Returns a dictionary mapping start_offset -> music21.key.Key object.
+    Accepts a quantized music21 stream or a ChordTimeline.
+    The window advances by hop_size beats (defaults to window_size, i.e.
+    non-overlapping windows); a hop smaller than the window gives overlapping
+    windows, each of which sets the key for the hop-sized region at its centre.
+    Returns a KeyMap of music21.key.Key objects and the global key.
     Falls back to the global key if a local window cannot be identified.
     """
-    local_keys = {}
-    total_length = quantized_stream.highestTime
-    global_key = detect_key(quantized_stream)
-    
+    if hop_size is None:
+        hop_size = window_size
+    onsets, weights = _note_weights(quantized_stream)
+    if isinstance(quantized_stream, ChordTimeline):
+        total_length = quantized_stream.highest_time
+        if len(onsets):
+            scores = _score_keys(weights.sum(axis=0, keepdims=True))[0]
+            global_key = _key_from_index(scores.argmax(), scores.max())
+        else:
+            global_key = music21_key.Key('C')
+    else:
+        total_length = quantized_stream.highestTime
+        global_key = detect_key(quantized_stream)
+
+    window_starts = []
     current_offset = 0.0
     while current_offset <= total_length:
-        # Extract a slice of the stream for the current window
-        window_stream = quantized_stream.getElementsByOffset(
-            current_offset, 
-            current_offset + window_size
-        ).stream()
-        
-        local_key = None
-        if len(window_stream.flatten().notes) >= 3:
-            try:
-                local_key = window_stream.analyze('key')
-            except Exception:
-                pass
-        
-        if local_key is None:
+        window_starts.append(current_offset)
+        current_offset += hop_size
+
+    histograms, counts = _sliding_histograms(onsets, weights, window_starts, window_size)
+    scores = _score_keys(histograms)
+    best = scores.argmax(axis=1)
+
+    region_starts = []
+    region_keys = []
+    previous_key = None
+    for w, start in enumerate(window_starts):
+        if counts[w] >= 3:
+            local_key = _key_from_index(best[w], scores[w, best[w]])
+        else:
             # Fall back to previous key or global key
-            if current_offset > 0 and (current_offset - window_size) in local_keys:
-                local_key = local_keys[current_offset - window_size]
-            else:
-                local_key = global_key
-                
-        local_keys[current_offset] = local_key
-        current_offset += window_size
+            local_key = previous_key or global_key
+        region_starts.append(start + (window_size - hop_size) / 2 if w > 0 else start)
+        region_keys.append(local_key)
+        previous_key = local_key
         
-    return local_keys, global_key
+    return KeyMap(region_starts, region_keys), global_key
 
-def guess_jazz_chord(chord_obj, local_key):
+class LRUCache:
+    """
+    Bounded least-recently-used memo with hit/miss counters.
+    """
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, cache_key):
+        if cache_key in self._entries:
+            self._entries.move_to_end(cache_key)
+            self.hits += 1
+            return self._entries[cache_key]
+        self.misses += 1
+        return None
+
+    def put(self, cache_key, value):
+        self._entries[cache_key] = value
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
+
+class ChordSymbolCache(LRUCache):
+    """
+    LRU memo for guess_jazz_chord, keyed on
+    (guesser version, pitch-class mask, bass pitch class, key tonic, key mode).
+    Jazz tunes repeat the same voicings constantly, so most lookups are hits.
+    Can be saved to and loaded from a JSON file to persist between runs.
+    """
+    def save(self, path, merge=False):
+        """
+        Writes the entries to a JSON file, atomically. With merge, entries
+        already saved at path (e.g. by another process) are kept as well,
+        as less recently used than ours.
+        """
+        entries = self._entries
+        if merge:
+            merged = ChordSymbolCache(self.maxsize)
+            merged.load(path)
+            for cache_key, value in entries.items():
+                merged.put(cache_key, value)
+            entries = merged._entries
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump([list(k) + [v] for k, v in entries.items()], f)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load(self, path):
+        """
+        Loads entries saved by save(). Missing or unreadable files are ignored.
+        """
+        try:
+            with open(path, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        for *cache_key, value in entries:
+            self.put(tuple(cache_key), value)
+
+# Shared across all guess_jazz_chord calls in the process
+chord_symbol_cache = ChordSymbolCache()
+# Bump when guess_jazz_chord's output changes, so saved symbols aren't reused
+GUESSER_VERSION = 2
+
+def _chord_symbol_key(chord_obj, local_key):
+    try:
+        bass = chord_obj.bass()
+        return (GUESSER_VERSION, chord_mask(chord_obj), bass.pitchClass if bass is not None else -1,
+                local_key.tonic.name, local_key.mode)
+    except Exception:
+        return None
+
+def guess_jazz_chord(chord_obj, local_key, cache=chord_symbol_cache):
     """
     Attempts to identify the chord symbol for a given cluster of notes.
-    If music21 fails, it uses the local key to guess implied roots (ii, V, I)
-    to see if the cluster is a rootless jazz voicing.
+    If music21 fails, it matches the cluster against jazz chord templates,
+    using the local key as a prior, to catch rootless jazz voicings.
+    Results are memoized in `cache` (pass None to bypass it).
     Returns a string like 'Cm7' or '?'
     """
+    cache_key = _chord_symbol_key(chord_obj, local_key) if cache is not None else None
+    if cache_key is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    symbol = _guess_jazz_chord(chord_obj, local_key)
+    if cache_key is not None:
+        cache.put(cache_key, symbol)
+    return symbol
+
+def _guess_jazz_chord(chord_obj, local_key):
     from music21 import harmony
     
     try:
@@ -67,26 +283,11 @@ def guess_jazz_chord(chord_obj, local_key):
         pass
         
     # If music21 failed, it's likely a messy cluster or rootless voicing.
-    # We will temporarily add diatonic roots from the local key to see if it 
-    # magically resolves into a clean, recognizable jazz chord.
-    
-    # Try adding I, ii, IV, V roots
-    test_degrees = [1, 2, 4, 5]
-    for degree in test_degrees:
-        try:
-            root_pitch = local_key.pitchFromDegree(degree)
-            if root_pitch:
-                root_pitch.octave = 3 # Put it in the bass
-                
-                # Create a temporary test chord
-                test_chord = chord.Chord([p for p in chord_obj.pitches] + [root_pitch])
-                cs = harmony.chordSymbolFromChord(test_chord)
-                
-                # If it successfully identified a standard 7th or 9th chord
-                if cs.figure and "Cannot" not in cs.figure:
-                    return cs.figure
-        except Exception:
-            continue
+    # Score it against the jazz chord templates (with and without roots)
+    # on all 12 roots, favouring roots that are diatonic to the local key.
+    figure = match_chord_templates([chord_obj], [local_key])[0]
+    if figure:
+        return figure
             
     # If all else fails, just return a generic representation of the lowest note
     if chord_obj.pitches:
@@ -95,28 +296,56 @@ def guess_jazz_chord(chord_obj, local_key):
         
     return "?"
 
+# Shared memo of (spelled pitch set, bass, key) -> RomanNumeral
+roman_numeral_cache = LRUCache()
+
+def roman_numeral_from_chord(chord_obj, key_obj, cache=roman_numeral_cache):
+    """
+    Memoized roman.romanNumeralFromChord. The figure only depends on the
+    spelled pitch names, the bass and the key, so repeated voicings share one
+    (read-only) RomanNumeral object. Raises like romanNumeralFromChord on failure.
+    """
+    try:
+        bass = chord_obj.bass()
+        cache_key = (frozenset(p.name for p in chord_obj.pitches), bass.name if bass is not None else None,
+                     key_obj.tonic.name, key_obj.mode)
+    except Exception:
+        cache_key = None
+    if cache_key is not None and cache is not None:
+        rn = cache.get(cache_key)
+        if rn is not None:
+            return rn
+
+    rn = roman.romanNumeralFromChord(chord_obj, key_obj)
+    if cache_key is not None and cache is not None:
+        cache.put(cache_key, rn)
+    return rn
+
+def _keys_for_chords(chords, local_keys):
+    offsets = chords.offsets if isinstance(chords, ChordTimeline) else [float(c.offset) for c in chords]
+    return KeyMap.coerce(local_keys).keys_at(offsets)
+
 def contextualize_chords(chords, local_keys, window_size=16.0):
     """
     Heuristic algorithm to detect and "fix" rootless jazz voicings.
     Modifies the underlying music21.chord.Chord objects in-place by adding 
     the implied root note based on the surrounding harmonic context.
+    local_keys may be a KeyMap, a {start_offset: Key} dictionary or a single
+    Key; window_size is unused and kept for backward compatibility.
+    Returns (raw Roman Numerals, key per chord, indices of the chords that were fixed).
     """
-    if not isinstance(local_keys, dict):
-        local_keys = {0.0: local_keys}
+    keys_for_chords = _keys_for_chords(chords, local_keys)
         
     # First pass: get the raw Roman Numerals
     raw_rns = []
-    keys_for_chords = []
-    for c in chords:
-        window_start = (c.offset // window_size) * window_size
-        current_key = local_keys.get(window_start, list(local_keys.values())[0])
-        keys_for_chords.append(current_key)
+    for c, current_key in zip(chords, keys_for_chords):
         try:
-            raw_rns.append(roman.romanNumeralFromChord(c, current_key))
+            raw_rns.append(roman_numeral_from_chord(c, current_key))
         except Exception:
             raw_rns.append(None)
             
     # Second pass: apply heuristic fixes
+    fixed = set()
     for i in range(len(chords)):
         rn = raw_rns[i]
         if not rn: continue
@@ -134,6 +363,7 @@ def contextualize_chords(chords, local_keys, window_size=16.0):
             root_pitch = current_key.pitchFromDegree(2)
             root_pitch.octave = 3 # Put it in the bass
             chords[i].add(root_pitch)
+            fixed.add(i)
             
         # Heuristic 2: Rootless V chord (Looks like viio or vii half-dim, followed by I or i)
         elif sd == 7 and (next_sd == 1 or next_sd is None):
@@ -141,6 +371,7 @@ def contextualize_chords(chords, local_keys, window_size=16.0):
             root_pitch = current_key.pitchFromDegree(5)
             root_pitch.octave = 3
             chords[i].add(root_pitch)
+            fixed.add(i)
             
         # Heuristic 3: Rootless I chord (Looks like iii, preceded by V)
         elif sd == 3 and prev_sd == 5:
@@ -148,32 +379,62 @@ def contextualize_chords(chords, local_keys, window_size=16.0):
             root_pitch = current_key.pitchFromDegree(1)
             root_pitch.octave = 3
             chords[i].add(root_pitch)
+            fixed.add(i)
+
+    return raw_rns, keys_for_chords, fixed
+
+def _contextualize_timeline(timeline, local_keys, window_size):
+    """
+    Array version of contextualize_chords + analyze_progression: resolves the
+    local key of every chord, derives scale degrees and adds implied roots
+    to rootless ii, V and I voicings in place.
+    """
+    keys_for_chords = _keys_for_chords(timeline, local_keys)
+    timeline.set_keys([key_to_index(k) for k in keys_for_chords])
+    raw_sd = timeline.scale_degree.copy()
+
+    for i in range(len(timeline)):
+        sd = raw_sd[i]
+        next_sd = raw_sd[i+1] if i + 1 < len(raw_sd) else None
+        prev_sd = raw_sd[i-1] if i - 1 >= 0 else None
+        current_key = keys_for_chords[i]
+
+        # Same heuristics as contextualize_chords: rootless ii, V and I chords
+        if sd == 4 and next_sd == 5:
+            timeline.add_root(i, current_key.pitchFromDegree(2).pitchClass)
+        elif sd == 7 and (next_sd == 1 or next_sd is None):
+            timeline.add_root(i, current_key.pitchFromDegree(5).pitchClass)
+        elif sd == 3 and prev_sd == 5:
+            timeline.add_root(i, current_key.pitchFromDegree(1).pitchClass)
+    return timeline
 
 def analyze_progression(chords, local_keys, window_size=16.0):
     """
     Performs Roman Numeral analysis on a list of chords given local key centers.
     Applies context-aware heuristics to fix rootless voicings before analysis.
+    Each chord is analyzed once; only chords that gained a root are re-analyzed.
+    Given a ChordTimeline, fills in its key_index and scale_degree columns
+    without creating music21 objects and returns the timeline instead.
     """
+    if isinstance(chords, ChordTimeline):
+        return _contextualize_timeline(chords, local_keys, window_size)
+
     # Fix rootless voicings in-place
-    contextualize_chords(chords, local_keys, window_size)
+    raw_rns, keys_for_chords, fixed = contextualize_chords(chords, local_keys, window_size)
     
     analysis = []
-    
-    # If a single key was passed instead of a dict, wrap it
-    if not isinstance(local_keys, dict):
-        local_keys = {0.0: local_keys}
-        
-    for c in chords:
-        # Find the relevant local key based on the chord's offset
-        window_start = (c.offset // window_size) * window_size
-        current_key = local_keys.get(window_start, list(local_keys.values())[0])
-        
-        try:
-            rn = roman.romanNumeralFromChord(c, current_key)
-            analysis.append(rn)
-        except Exception:
+    for i, c in enumerate(chords):
+        current_key = keys_for_chords[i]
+        rn = raw_rns[i]
+        if i in fixed:
+            try:
+                rn = roman_numeral_from_chord(c, current_key)
+            except Exception:
+                rn = None
+        if rn is None:
             # Create a dummy Roman Numeral if analysis fails
-            analysis.append(roman.RomanNumeral('I', current_key))
+            rn = roman.RomanNumeral('I', current_key)
+        analysis.append(rn)
             
     return analysis
 
@@ -182,73 +443,19 @@ def identify_ii_v_i(roman_numerals):
     Identifies ii-V-I patterns in a list of Roman Numerals using fuzzy matching.
     Matches based on root motion (scale degrees 2 -> 5 -> 1) OR pure root motion 
     intervals (+5 semitones / Perfect 4th up) to handle complex extensions.
+    Also accepts an analyzed ChordTimeline.
     Returns a list of indices where a ii-V-I starts.
     """
-    patterns = []
-    for i in range(len(roman_numerals) - 2):
-        r1 = roman_numerals[i]
-        r2 = roman_numerals[i+1]
-        r3 = roman_numerals[i+2]
-        
-        # Method A: Check for root movement: 2 -> 5 -> 1
-        sd1 = getattr(r1, 'scaleDegree', None)
-        sd2 = getattr(r2, 'scaleDegree', None)
-        sd3 = getattr(r3, 'scaleDegree', None)
-        
-        if sd1 == 2 and sd2 == 5 and sd3 == 1:
-            patterns.append(i)
-            continue
-            
-        # Method B: Root-Motion Fuzzy Matching (Down a 5th / Up a 4th)
-        try:
-            # Get the pitch classes of the roots
-            rt1 = r1.root().pitchClass
-            rt2 = r2.root().pitchClass
-            rt3 = r3.root().pitchClass
-            
-            # Up a perfect 4th is +5 semitones (or Down a 5th is -7 == +5 mod 12)
-            diff1 = (rt2 - rt1) % 12
-            diff2 = (rt3 - rt2) % 12
-            
-            if diff1 == 5 and diff2 == 5:
-                # Found a ii-V-I sequence based on root motion!
-                patterns.append(i)
-        except Exception:
-            # If the chord is too mangled to have a root, skip it
-            pass
-            
-    return patterns
+    return find_progressions(roman_numerals)['ii-V-I']
 
 def identify_tritone_subs(roman_numerals):
     """
     Identifies tritone substitutions (subV) resolving to a target chord.
     Specifically looks for ii - subV - I (root motion descending by half steps).
+    Also accepts an analyzed ChordTimeline.
     Returns a list of indices where the pattern starts.
     """
-    patterns = []
-    for i in range(len(roman_numerals) - 2):
-        r1 = roman_numerals[i]
-        r2 = roman_numerals[i+1]
-        r3 = roman_numerals[i+2]
-        
-        try:
-            # Get the pitch classes of the roots
-            rt1 = r1.root().pitchClass
-            rt2 = r2.root().pitchClass
-            rt3 = r3.root().pitchClass
-            
-            # A tritone substitution resolving down by half step means 
-            # the roots move by -1 semitone (or 11 mod 12).
-            # e.g., Dm7 -> Db7 -> Cmaj7 (Roots: 2 -> 1 -> 0)
-            diff1 = (rt2 - rt1) % 12
-            diff2 = (rt3 - rt2) % 12
-            
-            if diff1 == 11 and diff2 == 11:
-                patterns.append(i)
-        except Exception:
-            pass
-            
-    return patterns
+    return find_progressions(roman_numerals)['ii-subV-I']
 
 def get_guide_tones(c):
     """
@@ -267,18 +474,46 @@ def get_guide_tones(c):
     
     return res
 
+# Compiled key masks, keyed by (tonic name, mode)
+_KEY_MASKS = {}
+
+def key_mask(key):
+    """
+    Returns the 12-bit pitch-class mask of the key's scale.
+    Spelling is ignored here; it only matters for display.
+    """
+    cache_key = (key.tonic.name, key.mode)
+    mask = _KEY_MASKS.get(cache_key)
+    if mask is None:
+        mask = pitch_class_mask(p.pitchClass for p in key.pitches)
+        _KEY_MASKS[cache_key] = mask
+    return mask
+
 def is_diatonic(pitch, key):
     """
     Checks if a pitch is diatonic to the given key.
     """
-    return pitch.name in [p.name for p in key.pitches]
+    return bool(key_mask(key) >> pitch.pitchClass & 1)
+
+def non_diatonic_masks(chords, key):
+    """
+    Batch check: returns an array with, for each chord, the 12-bit mask of
+    its pitch classes that are non-diatonic to the key (0 if fully diatonic).
+    """
+    masks = np.array([chord_mask(c) for c in chords], dtype=np.int64)
+    return masks & ~key_mask(key) & 0xFFF
+
+def non_diatonic_pitch_classes(pitch_classes, key):
+    """
+    Batch check: returns a boolean array flagging the pitch classes that are
+    non-diatonic to the key.
+    """
+    pitch_classes = np.asarray(pitch_classes, dtype=np.int64)
+    return (key_mask(key) >> pitch_classes) & 1 == 0
 
 def analyze_non_diatonic_notes(chord_obj, key):
     """
     Identifies notes in a chord that are non-diatonic to the key.
     """
-    non_diatonic = []
-    for p in chord_obj.pitches:
-        if not is_diatonic(p, key):
-            non_diatonic.append(p)
-    return non_diatonic
+    mask = key_mask(key)
+    return [p for p in chord_obj.pitches if not mask >> p.pitchClass & 1]
@@ -0,0 +1,284 @@
+import argparse
+import csv
+import json
+import os
+import signal
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+MIDI_EXTENSIONS = ('.mid', '.midi')
+
+def collect_inputs(source):
+    """
+    Returns the MIDI files under a directory (recursively), or the paths
+    listed one per line in a manifest file (blank lines and # comments ignored).
+    """
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(MIDI_EXTENSIONS))
+        return sorted(paths)
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r') as f:
+        lines = [line.strip() for line in f]
+    return [line if os.path.isabs(line) else os.path.join(base, line) for line in lines if line and not line.startswith('#')]
+
+# A BaseException, so the pipeline's own `except Exception` fallbacks can't swallow a timeout
+class _Timeout(BaseException):
+    pass
+
+def _alarm_handler(signum, frame):
+    raise _Timeout()
+
+def analyze_file(midi_path, beats_per_chord=2.0, window_size=16.0, cache_dir=None):
+    """
+    Runs load -> quantize -> local keys -> progression analysis -> pattern
+    detection on one MIDI file and returns a JSON-serializable summary with
+    per-stage timings.
+    """
+    from src.cache import DiskCache, load_notes, quantize_timeline
+    from src.analyze import detect_local_keys, analyze_progression
+    from src.patterns import find_progressions
+
+    cache = DiskCache(cache_dir) if cache_dir else None
+    timings = {}
+
+    start = time.perf_counter()
+    # Unreadable files raise, so their record keeps the loader's error and traceback
+    notes = load_notes(midi_path, cache, raise_errors=True)
+    timings['load'] = time.perf_counter() - start
+    if notes is None or len(notes) == 0:
+        raise ValueError("no pitched notes found")
+
+    start = time.perf_counter()
+    timeline = quantize_timeline(midi_path, beats_per_chord, cache=cache, notes=notes)
+    timings['quantize'] = time.perf_counter() - start
+    if len(timeline) == 0:
+        raise ValueError("no chords after quantization")
+
+    start = time.perf_counter()
+    local_keys, global_key = detect_local_keys(timeline, window_size=window_size)
+    timings['keys'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    analyze_progression(timeline, local_keys, window_size=window_size)
+    timings['analyze'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    patterns = find_progressions(timeline)
+    timings['patterns'] = time.perf_counter() - start
+
+    return {
+        'global_key': str(global_key),
+        'num_chords': len(timeline),
+        'keys': [[offset, str(k)] for offset, k in local_keys.items()],
+        'offsets': timeline.offsets.tolist(),
+        'symbols': [timeline.symbol(i) for i in range(len(timeline))],
+        'roman': [timeline.roman_figure(i) for i in range(len(timeline))],
+        'patterns': patterns,
+        'timings': timings,
+    }
+
+def _item_file(item):
+    """Work items are file paths, or tuples whose first element is the file path."""
+    return item if isinstance(item, str) else item[0]
+
+def _run_isolated(fn, item, timeout, options):
+    """
+    Runs fn(item, **options) inside a worker, turning exceptions and
+    timeouts into error records so one bad file never kills the batch.
+    """
+    record = {'file': _item_file(item)}
+    use_alarm = timeout and hasattr(signal, 'setitimer')
+    start = time.perf_counter()
+    try:
+        if use_alarm:
+            previous = signal.signal(signal.SIGALRM, _alarm_handler)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        try:
+            record.update(fn(item, **options))
+            record['status'] = 'ok'
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous)
+    except _Timeout:
+        record['status'] = 'timeout'
+        record['error'] = f"exceeded {timeout}s"
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = f"{type(e).__name__}: {e}"
+        record['traceback'] = traceback.format_exc()
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+# guess_jazz_chord results are persisted in the cache directory and shared by all workers
+CHORD_SYMBOLS_FILE = 'chord_symbols.json'
+# Symbol cache misses at this process's last load/save, per cache directory
+_chord_symbols_synced = {}
+
+def _sync_chord_symbols(cache_dir):
+    """
+    Loads the persisted chord symbols into this process's shared cache the
+    first time cache_dir is seen, and afterwards saves them (merged with
+    other workers' saves) whenever new symbols were computed.
+    """
+    from src.analyze import chord_symbol_cache
+
+    path = os.path.join(cache_dir, CHORD_SYMBOLS_FILE)
+    if cache_dir not in _chord_symbols_synced:
+        chord_symbol_cache.load(path)
+    elif chord_symbol_cache.misses > _chord_symbols_synced[cache_dir]:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            chord_symbol_cache.save(path, merge=True)
+        except OSError as e:
+            print(f"Could not save chord symbol cache {path}: {e}")
+    _chord_symbols_synced[cache_dir] = chord_symbol_cache.misses
+
+def _process_chunk(fn, items, timeout, options):
+    cache_dir = options.get('cache_dir')
+    if cache_dir:
+        _sync_chord_symbols(cache_dir)
+    records = [_run_isolated(fn, item, timeout, options) for item in items]
+    if cache_dir:
+        _sync_chord_symbols(cache_dir)
+    return records
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _failed_records(items, error):
+    return [{'file': _item_file(item), 'status': 'error', 'error': error, 'seconds': 0.0} for item in items]
+
+def run_parallel(fn, paths, workers=None, chunk_size=8, timeout=None, **options):
+    """
+    Applies fn(path, **options) to every path across worker processes, in
+    chunks of chunk_size files per task. Paths can also be tuples starting
+    with the path, to ship per-file arguments with each file. Yields result records as chunks
+    complete (not in input order); each has 'file', 'status' and 'seconds'.
+    fn must be a picklable module-level function.
+
+    Each worker is its own single-process executor with one chunk in flight,
+    so a worker that dies (e.g. out of memory) only loses its own chunk: the
+    worker is replaced and the chunk's files are retried one per task, and
+    a file that kills a worker on its own is reported as crashed.
+    """
+    if workers == 1:
+        for chunk in _chunks(paths, chunk_size):
+            yield from _process_chunk(fn, chunk, timeout, options)
+        return
+
+    pending = list(_chunks(paths, chunk_size))
+    pending.reverse()
+    running = {}
+
+    def submit(executor):
+        chunk = pending.pop()
+        running[executor.submit(_process_chunk, fn, chunk, timeout, options)] = (executor, chunk)
+
+    try:
+        for _ in range(min(workers or os.cpu_count() or 1, len(pending))):
+            submit(ProcessPoolExecutor(max_workers=1))
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                executor, chunk = running.pop(future)
+                try:
+                    yield from future.result()
+                except BrokenProcessPool:
+                    executor.shutdown(wait=False)
+                    executor = ProcessPoolExecutor(max_workers=1)
+                    if len(chunk) > 1:
+                        pending.extend([item] for item in reversed(chunk))
+                    else:
+                        yield from _failed_records(chunk, "worker process crashed")
+                except Exception as e:
+                    # The chunk's results could not be sent back (e.g. unpicklable)
+                    yield from _failed_records(chunk, f"worker failed: {e}")
+                if pending:
+                    submit(executor)
+                else:
+                    executor.shutdown(wait=False)
+    finally:
+        for future, (executor, _) in running.items():
+            future.cancel()
+            executor.shutdown(wait=False)
+
+_CSV_FIELDS = ['file', 'status', 'seconds', 'num_chords', 'global_key', 'error']
+
+class ResultWriter:
+    """
+    Streams result records to a JSONL file, or to a CSV summary table
+    (one row per file, one column per pattern) when the path ends in .csv.
+    """
+    def __init__(self, path, pattern_names=()):
+        self.path = path
+        self.columnar = path.endswith('.csv')
+        self.pattern_names = list(pattern_names)
+        self._file = open(path, 'w', newline='')
+        if self.columnar:
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(_CSV_FIELDS + self.pattern_names)
+
+    def write(self, record):
+        if self.columnar:
+            patterns = record.get('patterns', {})
+            self._writer.writerow([record.get(f, '') for f in _CSV_FIELDS] + [len(patterns.get(n, [])) for n in self.pattern_names])
+        else:
+            self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def run_batch(source, output_path, workers=None, chunk_size=8, timeout=120.0,
+              beats_per_chord=2.0, window_size=16.0, cache_dir=None):
+    """
+    Runs the full analysis pipeline over a directory or manifest of MIDI
+    files in parallel, streaming one record per file to output_path.
+    Returns (number of files processed, number of failures).
+    """
+    from src.patterns import default_matcher
+
+    paths = collect_inputs(source)
+    writer = ResultWriter(output_path, default_matcher.names)
+    done = failed = 0
+    try:
+        for record in run_parallel(analyze_file, paths, workers=workers, chunk_size=chunk_size, timeout=timeout,
+                                   beats_per_chord=beats_per_chord, window_size=window_size, cache_dir=cache_dir):
+            writer.write(record)
+            done += 1
+            if record['status'] != 'ok':
+                failed += 1
+                print(f"[{done}/{len(paths)}] {record['file']}: {record['status']} ({record.get('error')})")
+            else:
+                print(f"[{done}/{len(paths)}] {record['file']}: {record['num_chords']} chords in {record['seconds']:.2f}s")
+    finally:
+        writer.close()
+    return done, failed
+
+if __name__ == '__main__':
+    from src.cache import DEFAULT_CACHE_DIR
+
+    parser = argparse.ArgumentParser(description="Analyze a corpus of MIDI files in parallel.")
+    parser.add_argument('source', help="directory of MIDI files or a manifest with one path per line")
+    parser.add_argument('-o', '--output', default='batch_results.jsonl', help="output .jsonl (full records) or .csv (summary)")
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=120.0, help="per-file timeout in seconds")
+    parser.add_argument('--beats-per-chord', type=float, default=2.0)
+    parser.add_argument('--window-size', type=float, default=16.0)
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args()
+
+    done, failed = run_batch(args.source, args.output, workers=args.workers, chunk_size=args.chunk_size,
+                             timeout=args.timeout, beats_per_chord=args.beats_per_chord,
+                             window_size=args.window_size, cache_dir=None if args.no_cache else DEFAULT_CACHE_DIR)
+    print(f"Processed {done} files ({failed} failed). Results written to {args.output}")
+    sys.exit(1 if failed and failed == done else 0)
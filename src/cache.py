@@ -0,0 +1,215 @@
+import hashlib
+import os
+import tempfile
+import numpy as np
+from src.source import LOADER_VERSION, NoteTable, load_midi, load_midi_notes
+from src.parse import DEFAULT_SHIFT, DEFAULT_START_OFFSET, QUANTIZER_VERSION, quantize_harmony
+from src.timeline import ChordTimeline
+
+DEFAULT_CACHE_DIR = os.environ.get('JAZZ_ANALYZER_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'jazz-analyzer'))
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# File suffixes of the entries DiskCache writes (put_bytes, put_arrays)
+ENTRY_SUFFIXES = ('.bin', '.npz')
+
+class DiskCache:
+    """
+    Content-addressed on-disk cache. Entries are files named by a SHA-256
+    key; reading an entry refreshes its mtime, and once the entries grow
+    past max_bytes the least recently used ones are evicted. Other files
+    under the root are never counted or evicted.
+    Eviction walks the whole directory, so each process only runs it after
+    writing another max_bytes / EVICT_EVERY bytes to the same root.
+    """
+    EVICT_EVERY = 16
+    # Bytes written by this process to each cache root since its last eviction
+    _unevicted = {}
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.root, key[:2], key + suffix)
+
+    def _read(self, path, reader):
+        try:
+            value = reader(path)
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            # Evicted by another process since the read; the value is still good
+            pass
+        return value
+
+    def _write(self, path, writer):
+        # Write to a temporary file first so concurrent readers never see a partial entry
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                writer(f)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        written = DiskCache._unevicted.get(self.root, 0) + size
+        DiskCache._unevicted[self.root] = written
+        if written > self.max_bytes // self.EVICT_EVERY:
+            self.evict()
+
+    def get_bytes(self, key):
+        def reader(path):
+            with open(path, 'rb') as f:
+                return f.read()
+        return self._read(self._path(key, '.bin'), reader)
+
+    def put_bytes(self, key, data):
+        self._write(self._path(key, '.bin'), lambda f: f.write(data))
+
+    def get_arrays(self, key):
+        def reader(path):
+            with np.load(path, allow_pickle=False) as data:
+                return {name: data[name] for name in data.files}
+        return self._read(self._path(key, '.npz'), reader)
+
+    def put_arrays(self, key, **arrays):
+        self._write(self._path(key, '.npz'), lambda f: np.savez_compressed(f, **arrays))
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        """
+        Yields (path, size, mtime) for the entry files only: those in the
+        two-hex-digit shard directories written by _path. Anything else kept
+        under the root (the ground truth store, chord_symbols.json) is left alone.
+        """
+        try:
+            shards = [name for name in os.listdir(self.root)
+                      if len(name) == 2 and all(c in '0123456789abcdef' for c in name)]
+        except OSError:
+            return
+        for shard in shards:
+            dirpath = os.path.join(self.root, shard)
+            try:
+                filenames = os.listdir(dirpath)
+            except OSError:
+                continue
+            for filename in filenames:
+                if not filename.startswith(shard) or not filename.endswith(ENTRY_SUFFIXES):
+                    continue
+                path = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def evict(self):
+        """
+        Removes least recently used entries until the cache fits in max_bytes.
+        """
+        DiskCache._unevicted[self.root] = 0
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        for path, _, _ in list(self._entries()):
+            os.remove(path)
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+# 'mido' is the fast single-pass loader; 'music21' flattens the load_midi score,
+# which splits notes at barlines, so the reference scripts keep their exact output
+LOADERS = ('mido', 'music21')
+
+def _load_uncached(midi_path, loader, raise_errors=False):
+    if loader == 'music21':
+        score = load_midi(midi_path, raise_errors=raise_errors)
+        return NoteTable.from_score(score, midi_path) if score is not None else None
+    return load_midi_notes(midi_path, raise_errors=raise_errors)
+
+def load_notes(midi_path, cache=None, digest=None, loader='mido', raise_errors=False):
+    """
+    Loads a MIDI file's filtered NoteTable with the given loader (see
+    LOADERS), from the cache when the file content, loader and loader
+    version match a stored entry. cache=None disables caching.
+    Unreadable files give None, or raise the loader's error with raise_errors.
+    """
+    if cache is None:
+        return _load_uncached(midi_path, loader, raise_errors)
+
+    key = DiskCache.make_key('notes', digest or file_digest(midi_path), loader, LOADER_VERSION)
+    arrays = cache.get_arrays(key)
+    if arrays is not None:
+        return NoteTable(source_path=midi_path, **arrays)
+
+    notes = _load_uncached(midi_path, loader, raise_errors)
+    if notes is not None:
+        arrays = dict(onset=notes.onset, duration=notes.duration, pitch=notes.pitch,
+                      velocity=notes.velocity, channel=notes.channel, program=notes.program)
+        if notes.length is not None:
+            arrays['length'] = np.array(notes.length)
+        cache.put_arrays(key, **arrays)
+    return notes
+
+def _timeline_arrays(timeline):
+    return {
+        'offsets': timeline.offsets, 'durations': timeline.durations,
+        'root_pc': timeline.root_pc, 'pc_mask': timeline.pc_mask, 'bass_pc': timeline.bass_pc,
+        'symbol_id': timeline.symbol_id, 'symbols': np.array(timeline.symbols, dtype=str),
+    }
+
+def _timeline_from_arrays(arrays):
+    return ChordTimeline(arrays['offsets'], arrays['durations'], arrays['root_pc'], arrays['pc_mask'],
+                         bass_pc=arrays['bass_pc'], symbols=arrays['symbols'].tolist(), symbol_id=arrays['symbol_id'])
+
+def quantize_timeline(midi_path, beats_per_chord=4.0, cache=None, notes=None,
+                      shift=DEFAULT_SHIFT, start_offset=DEFAULT_START_OFFSET, loader='mido', raise_errors=False):
+    """
+    Returns the quantized ChordTimeline of a MIDI file, from the cache when
+    the file content, loader/quantizer versions and parameters match.
+    Pass `notes` to reuse a NoteTable already loaded with `loader` on a
+    cache miss. cache=None disables caching; raise_errors is passed to load_notes.
+    """
+    if cache is None:
+        notes = notes if notes is not None else _load_uncached(midi_path, loader, raise_errors)
+        if notes is None:
+            return None
+        return quantize_harmony(notes, beats_per_chord, as_timeline=True, shift=shift, start_offset=start_offset)
+
+    digest = file_digest(midi_path)
+    key = DiskCache.make_key('timeline', digest, loader, LOADER_VERSION, QUANTIZER_VERSION, float(beats_per_chord),
+                             float(shift), float(start_offset))
+    arrays = cache.get_arrays(key)
+    if arrays is not None:
+        return _timeline_from_arrays(arrays)
+
+    notes = notes if notes is not None else load_notes(midi_path, cache, digest, loader, raise_errors)
+    if notes is None:
+        return None
+    timeline = quantize_harmony(notes, beats_per_chord, as_timeline=True, shift=shift, start_offset=start_offset)
+    cache.put_arrays(key, **_timeline_arrays(timeline))
+    return timeline
@@ -0,0 +1,73 @@
+import re
+
+# Root letter, accidentals (music21 '-' or lead-sheet 'b' for flats), then the quality suffix and optional /bass
+_SYMBOL_PATTERN = re.compile(r'^([A-G])(#{1,2}|b{1,2}|-{1,2})?([^/]*)(?:/([A-G])(#{1,2}|b{1,2}|-{1,2})?)?$')
+_LETTER_PCS = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+_ACCIDENTALS = {None: 0, '#': 1, '##': 2, 'b': -1, 'bb': -2, '-': -1, '--': -2}
+
+# Equivalent spellings of the same suffix, mapped to the spelling our templates use
+_SUFFIX_ALIASES = {
+    'ø7': 'm7b5', 'ø': 'm7b5', 'm7-5': 'm7b5', 'min7b5': 'm7b5',
+    'o7': 'dim7', 'o': 'dim', '°7': 'dim7', '°': 'dim',
+    'M7': 'maj7', 'Δ7': 'maj7', 'Δ': 'maj7', 'ma7': 'maj7',
+    '-7': 'm7', 'min7': 'm7', 'mi7': 'm7', '-': 'm', 'min': 'm', 'mi': 'm',
+    '+': 'aug', 'sus': 'sus4', '7sus': '7sus4', 'alt': '7alt', '7#5#9': '7alt',
+}
+
+QUALITIES = ('major', 'minor', 'dominant', 'half-diminished', 'diminished', 'augmented', 'suspended', 'other')
+
+def _pitch_class(letter, accidental):
+    return (_LETTER_PCS[letter] + _ACCIDENTALS[accidental]) % 12
+
+def normalize_suffix(suffix):
+    return _SUFFIX_ALIASES.get(suffix, suffix)
+
+def quality_family(suffix):
+    """
+    Collapses a chord suffix ('m7', '7b9', 'maj7', 'ø7', '6', ...) into one
+    of QUALITIES.
+    """
+    s = normalize_suffix(suffix)
+    if s.startswith('m7b5'):
+        return 'half-diminished'
+    if s.startswith('dim'):
+        return 'diminished'
+    if s.startswith('maj') or s == '' or s.startswith('6') or s.startswith('add'):
+        return 'major'
+    if s.startswith('m'):
+        return 'minor'
+    if s.startswith('aug') or s.startswith('+'):
+        if 'M7' in s or 'maj7' in s:
+            return 'major'
+        return 'dominant' if '7' in s else 'augmented'
+    if s.startswith('sus'):
+        return 'suspended'
+    if s[:1].isdigit() or s.startswith('7alt'):
+        return 'other' if s == '5' else 'dominant'
+    return 'other'
+
+def parse_symbol(symbol):
+    """
+    Splits a chord symbol written by music21 ('B-m7', 'Cø7', 'Cm7/E-') or
+    by parse_lilypond_chords ('Bbm7b5') into (root pc, normalized suffix,
+    quality family, bass pc). Unparseable symbols like 'X?' give a None root.
+    """
+    match = _SYMBOL_PATTERN.match(symbol or '')
+    if not match or '?' in symbol:
+        return None, None, None, None
+    letter, accidental, suffix, bass_letter, bass_accidental = match.groups()
+    suffix = normalize_suffix(suffix)
+    bass = _pitch_class(bass_letter, bass_accidental) if bass_letter else None
+    return _pitch_class(letter, accidental), suffix, quality_family(suffix), bass
+
+def compare_symbols(truth, analyzed):
+    """
+    Returns (same symbol, same root, same quality family) for two chord
+    symbols. Root spelling and slash basses are ignored, since the lead
+    sheets do not notate inversions.
+    """
+    truth_root, truth_suffix, truth_quality, _ = parse_symbol(truth)
+    root, suffix, quality, _ = parse_symbol(analyzed)
+    same_root = truth_root is not None and truth_root == root
+    same_quality = truth_quality is not None and truth_quality == quality
+    return same_root and truth_suffix == suffix, same_root, same_quality
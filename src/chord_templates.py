@@ -0,0 +1,121 @@
+import numpy as np
+from music21 import note
+
+# Jazz chord qualities as (figure suffix, intervals above the root).
+# Suffixes are spelled so music21's ChordSymbol can parse the resulting figure.
+CHORD_QUALITIES = [
+    ('maj7', (0, 4, 7, 11)),
+    ('m7', (0, 3, 7, 10)),
+    ('7', (0, 4, 7, 10)),
+    ('m7b5', (0, 3, 6, 10)),
+    ('dim7', (0, 3, 6, 9)),
+    ('7b9', (0, 4, 7, 10, 1)),
+    ('7#9', (0, 4, 7, 10, 3)),
+    ('9', (0, 4, 7, 10, 2)),
+    ('11', (0, 7, 10, 2, 5)),
+    ('13', (0, 4, 7, 10, 2, 9)),
+    ('7#5#9', (0, 4, 8, 10, 3)),  # altered dominant
+    ('7sus4', (0, 5, 7, 10)),
+]
+
+# Scoring weights: each template tone present scores +1, each extra
+# pitch class costs EXTRA_PENALTY and each missing template tone MISSING_PENALTY.
+EXTRA_PENALTY = 1.0
+MISSING_PENALTY = 0.5
+# A match must reach this score to be accepted
+MIN_SCORE = 2.0
+
+# Bonus for roots on scale degrees of the local key: I, ii and V score highest
+_MAJOR_ROOT_PRIOR = np.array([0.5, 0, 0.5, 0, 0.25, 0.25, 0, 0.5, 0, 0.25, 0, 0.25])
+_MINOR_ROOT_PRIOR = np.array([0.5, 0, 0.5, 0.25, 0, 0.25, 0, 0.5, 0.25, 0, 0.25, 0])
+
+def _build_templates():
+    """
+    Builds one row per (quality, voicing, root): every quality with and
+    without its root, transposed to all 12 roots.
+    """
+    masks, suffixes, roots = [], [], []
+    for suffix, intervals in CHORD_QUALITIES:
+        for voicing in (intervals, intervals[1:]):
+            for root in range(12):
+                row = np.zeros(12)
+                row[[(root + i) % 12 for i in voicing]] = 1
+                masks.append(row)
+                suffixes.append(suffix)
+                roots.append(root)
+    return np.array(masks), suffixes, np.array(roots)
+
+TEMPLATES, TEMPLATE_SUFFIXES, TEMPLATE_ROOTS = _build_templates()
+_WEIGHTS = (1 + EXTRA_PENALTY + MISSING_PENALTY) * TEMPLATES - EXTRA_PENALTY
+_BIAS = -MISSING_PENALTY * TEMPLATES.sum(axis=1)
+
+def pitch_class_vector(chord_obj):
+    vector = np.zeros(12)
+    for p in chord_obj.pitches:
+        vector[p.pitchClass] = 1
+    return vector
+
+def root_prior(key_obj):
+    """
+    Returns the 12-element bonus for each possible root in the given key.
+    """
+    if key_obj is None:
+        return np.zeros(12)
+    profile = _MINOR_ROOT_PRIOR if key_obj.mode == 'minor' else _MAJOR_ROOT_PRIOR
+    return np.roll(profile, key_obj.tonic.pitchClass)
+
+def spell_root(pitch_class, key_obj=None):
+    """
+    Names a root pitch class the way the key spells it: as its scale pitch
+    (or, in minor, the raised 6th or 7th) when it has one, otherwise with
+    sharps in sharp keys and flats elsewhere (C major and A minor included,
+    as in lead sheets: Bb7 rather than A#7).
+    """
+    pitch_class = int(pitch_class)
+    if key_obj is None:
+        return note.Pitch(pitch_class).name
+    spellings = [key_obj.pitchFromDegree(degree) for degree in range(1, 8)]
+    if key_obj.mode == 'minor':
+        spellings += [key_obj.pitchFromDegree(degree).transpose('A1') for degree in (6, 7)]
+    for p in spellings:
+        if p.pitchClass == pitch_class:
+            return p.name
+    p = note.Pitch(pitch_class)
+    alter = p.accidental.alter if p.accidental is not None else 0
+    if (alter > 0 and key_obj.sharps <= 0) or (alter < 0 and key_obj.sharps > 0):
+        p = p.getEnharmonic()
+    return p.name
+
+def score_chord_templates(pc_vectors, priors=None):
+    """
+    Scores an (n, 12) array of pitch-class vectors against every template
+    with a single matrix product. priors is an optional (n, 12) array of
+    per-root bonuses (see root_prior). Returns an (n, num_templates) array.
+    """
+    scores = np.atleast_2d(pc_vectors) @ _WEIGHTS.T + _BIAS
+    if priors is not None:
+        scores += np.atleast_2d(priors)[:, TEMPLATE_ROOTS]
+    return scores
+
+def match_chord_templates(chords, keys=None):
+    """
+    Finds the best jazz chord template for each chord in one batch,
+    using the matching local key (if given) as a prior on the root.
+    Roots are spelled in the key (see spell_root).
+    Returns a list of figures like 'Dm7', or None where nothing fits well.
+    """
+    if not chords:
+        return []
+    pc_vectors = np.array([pitch_class_vector(c) for c in chords])
+    priors = np.array([root_prior(k) for k in keys]) if keys is not None else None
+    scores = score_chord_templates(pc_vectors, priors)
+    best = scores.argmax(axis=1)
+
+    figures = []
+    for i, t in enumerate(best):
+        if scores[i, t] < MIN_SCORE:
+            figures.append(None)
+        else:
+            key_obj = keys[i] if keys is not None else None
+            figures.append(spell_root(TEMPLATE_ROOTS[t], key_obj) + TEMPLATE_SUFFIXES[t])
+    return figures
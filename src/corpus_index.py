@@ -0,0 +1,206 @@
+import os
+import sqlite3
+import sys
+from src.patterns import default_matcher, progression_tokens
+from src.timeline import ChordTimeline
+
+# Longest progression (in chords) stored in the index
+DEFAULT_MAX_N = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tunes (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    num_chords INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ngrams (
+    motion TEXT NOT NULL,
+    qualities TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    tune_id INTEGER NOT NULL REFERENCES tunes(id) ON DELETE CASCADE,
+    chord_index INTEGER NOT NULL,
+    offset REAL NOT NULL,
+    mode TEXT
+);
+CREATE INDEX IF NOT EXISTS ngrams_motion ON ngrams (motion, n);
+CREATE INDEX IF NOT EXISTS ngrams_tune ON ngrams (tune_id);
+"""
+
+def _motion_key(intervals):
+    return ','.join(str(i % 12) for i in intervals)
+
+def _quality_like(qualities):
+    """
+    Turns a quality sequence (None = any) into a LIKE pattern over the stored
+    comma-separated qualities.
+    """
+    return ','.join('%' if q is None else q for q in qualities)
+
+def _progression_modes(progression):
+    if isinstance(progression, ChordTimeline):
+        return [None if k < 0 else ('minor' if k >= 12 else 'major') for k in progression.key_index.tolist()]
+    modes = []
+    for rn in progression:
+        key_obj = getattr(rn, 'key', None)
+        modes.append(getattr(key_obj, 'mode', None))
+    return modes
+
+def progression_ngrams(progression, offsets=None, max_n=DEFAULT_MAX_N):
+    """
+    Yields (motion, qualities, n, chord_index, offset, mode) for every run of
+    2..max_n consecutive chords with known roots. `motion` is the
+    transposition-invariant root motion (semitones mod 12) and `mode` the
+    local key mode at the first chord.
+    """
+    roots, _, qualities = progression_tokens(progression)
+    modes = _progression_modes(progression)
+    if offsets is None:
+        offsets = progression.offsets.tolist() if isinstance(progression, ChordTimeline) else list(range(len(roots)))
+
+    for start in range(len(roots)):
+        if roots[start] is None:
+            continue
+        intervals = []
+        for end in range(start + 1, min(start + max_n, len(roots))):
+            if roots[end] is None:
+                break
+            intervals.append((roots[end] - roots[end - 1]) % 12)
+            yield (_motion_key(intervals), ','.join(q or 'other' for q in qualities[start:end + 1]),
+                   end - start + 1, start, float(offsets[start]), modes[start])
+
+class CorpusIndex:
+    """
+    Persistent SQLite inverted index of root-motion/quality n-grams across a
+    corpus of analyzed tunes. Queries return (tune name, offset) hits.
+    """
+    def __init__(self, path, max_n=DEFAULT_MAX_N):
+        self.path = path
+        self.max_n = max_n
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def add_tune(self, name, progression, offsets=None):
+        """
+        Indexes an analyzed progression (RomanNumerals from analyze_progression
+        or an analyzed ChordTimeline), replacing any previous entry for `name`.
+        `offsets` gives chord offsets for RomanNumeral lists (defaults to indices).
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM tunes WHERE name = ?", (name,))
+            tune_id = self.conn.execute("INSERT INTO tunes (name, num_chords) VALUES (?, ?)",
+                                        (name, len(progression))).lastrowid
+            self.conn.executemany(
+                "INSERT INTO ngrams (motion, qualities, n, tune_id, chord_index, offset, mode) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((motion, qualities, n, tune_id, idx, offset, mode)
+                 for motion, qualities, n, idx, offset, mode in progression_ngrams(progression, offsets, self.max_n)))
+        return tune_id
+
+    def tunes(self):
+        return [row[0] for row in self.conn.execute("SELECT name FROM tunes ORDER BY name")]
+
+    def find_motion(self, intervals, qualities=None, mode=None):
+        """
+        Finds every run of chords with the given root motion (semitones up,
+        mod 12) and optional per-chord qualities (None matches any) whose
+        first chord is in a key of the given mode.
+        Returns a list of (tune name, offset).
+        """
+        n = len(intervals) + 1
+        if n > self.max_n:
+            raise ValueError(f"Index only stores progressions of up to {self.max_n} chords")
+        sql = ("SELECT tunes.name, ngrams.offset FROM ngrams JOIN tunes ON tunes.id = ngrams.tune_id "
+               "WHERE ngrams.motion = ? AND ngrams.n = ?")
+        params = [_motion_key(intervals), n]
+        if qualities is not None:
+            sql += " AND ngrams.qualities LIKE ?"
+            params.append(_quality_like(qualities))
+        if mode is not None:
+            sql += " AND ngrams.mode = ?"
+            params.append(mode)
+        sql += " ORDER BY tunes.name, ngrams.offset"
+        return [tuple(row) for row in self.conn.execute(sql, params)]
+
+    def find_pattern(self, name, mode=None, matcher=default_matcher):
+        """
+        Finds a named root-motion pattern from the matcher's library, e.g.
+        find_pattern('ii-subV-I', mode='minor'). Degree-only patterns are not
+        transposition invariant and are skipped.
+        """
+        hits = []
+        for pattern in matcher.patterns:
+            if pattern.name == name and pattern.intervals is not None:
+                hits.extend(self.find_motion(pattern.intervals, pattern.qualities, mode))
+        return sorted(set(hits))
+
+    def find_chords(self, figures, mode=None):
+        """
+        Finds a sequence of chord symbols (e.g. ['Dm7', 'G7', 'Cmaj7']) in any
+        transposition, matching root motion and chord quality.
+        """
+        from music21 import harmony
+        from src.patterns import chord_quality
+        from src.pcset import chord_mask
+
+        roots, qualities = [], []
+        for figure in figures:
+            cs = harmony.ChordSymbol(figure)
+            roots.append(cs.root().pitchClass)
+            qualities.append(chord_quality(roots[-1], chord_mask(cs)))
+        intervals = [(b - a) % 12 for a, b in zip(roots, roots[1:])]
+        return self.find_motion(intervals, qualities, mode)
+
+    def tunes_containing(self, name, mode=None):
+        return sorted(set(tune for tune, _ in self.find_pattern(name, mode)))
+
+def index_midi_file(index, midi_path, beats_per_chord=2.0, window_size=16.0, name=None):
+    """
+    Runs the MIDI pipeline (load -> quantize -> local keys -> analysis) and
+    adds the tune to the index under `name`, by default its path. Tune names
+    are unique, so same-named files in different folders need distinct names.
+    """
+    from src.source import load_midi_notes
+    from src.parse import quantize_harmony
+    from src.analyze import detect_local_keys, analyze_progression
+
+    notes = load_midi_notes(midi_path)
+    if notes is None:
+        return None
+    timeline = quantize_harmony(notes, beats_per_chord=beats_per_chord, as_timeline=True)
+    if len(timeline) == 0:
+        return None
+    local_keys, _ = detect_local_keys(timeline, window_size=window_size)
+    analyze_progression(timeline, local_keys, window_size=window_size)
+    return index.add_tune(name or midi_path, timeline)
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: python -m src.corpus_index build <index.db> <midi_dir>")
+        print("       python -m src.corpus_index query <index.db> <pattern name> [major|minor]")
+        sys.exit(1)
+
+    command, db_path = sys.argv[1], sys.argv[2]
+    with CorpusIndex(db_path) as index:
+        if command == 'build':
+            # Tunes are named by their path relative to the corpus directory
+            for root, _, files in os.walk(sys.argv[3]):
+                for filename in sorted(files):
+                    if filename.lower().endswith(('.mid', '.midi')):
+                        midi_path = os.path.join(root, filename)
+                        name = os.path.relpath(midi_path, sys.argv[3])
+                        print(f"Indexing {name}...")
+                        index_midi_file(index, midi_path, name=name)
+        else:
+            mode = sys.argv[4] if len(sys.argv) > 4 else None
+            for tune, offset in index.find_pattern(sys.argv[3], mode):
+                print(f"{tune} @ {offset}")
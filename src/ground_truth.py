@@ -1,76 +1,287 @@
 import re
 import os
+import sqlite3
+import sys
+from fractions import Fraction
 
-def parse_lilypond_chords(filepath, version='ChordsReal'):
-    """
-    Parses a LilyPond .ly.mako file to extract chord progressions.
-    Returns a clean list of chord symbols representing the ground truth.
-    """
-    if not os.path.exists(filepath):
-        print(f"Error: Could not find ground truth file {filepath}")
-        return []
+# Bump when parsing changes so compiled stores re-parse every file
+PARSER_VERSION = 1
 
-    with open(filepath, 'r') as f:
-        content = f.read()
+MAKO_SUFFIX = '.ly.mako'
 
-    # Extract the relevant block (e.g., % if part=='ChordsReal': ... % endif)
-    block_pattern = re.compile(rf"% if part=='{version}':(.*?)% endif", re.DOTALL)
-    match = block_pattern.search(content)
-    
-    if not match:
-        print(f"Could not find {version} section in {filepath}")
-        return []
+# Only sections with these name prefixes hold chords (the others are melody, lyrics, ...)
+CHORD_SECTION_PREFIX = 'Chords'
+
+# Extract a block (e.g., % if part=='ChordsReal': ... % endif)
+_SECTION_PATTERN = re.compile(r"% if part=='(\w+)':(.*?)% endif", re.DOTALL)
 
-    chord_block = match.group(1)
-    
-    # LilyPond chords: a-g, optional is/es, optional duration, optional colon and quality
-    chord_pattern = re.compile(r'\b([a-g])(is|es)?([\d\*\.]*)(?::([a-zA-Z\d\.\-]+))?\b')
-    
+# LilyPond chords: a-g, optional is/es, optional duration, optional colon and quality
+_CHORD_PATTERN = re.compile(r'\b([a-g])(is|es)?([\d\*\.]*)(?::([a-zA-Z\d\.\-]+))?\b')
+
+# Rests and skips take time but carry no chord
+_REST_PATTERN = re.compile(r'^[rsR]([\d\*\.]*)$')
+
+def _chord_quality(quality):
+    if not quality:
+        return ''
+    if quality.startswith('m7.5-'):
+        return 'm7b5'
+    elif quality.startswith('maj7'):
+        return 'maj7'
+    elif quality.startswith('m7'):
+        return 'm7'
+    elif quality.startswith('m'):
+        return 'm'
+    elif quality.startswith('7.9-'):
+        return '7b9'
+    elif quality.startswith('7'):
+        return '7'
+    elif quality.startswith('dim'):
+        return 'dim'
+    return quality
+
+def _duration_beats(duration, previous):
+    """
+    Converts a LilyPond duration ('2', '4.', '1*2') to quarter-note beats.
+    An omitted duration repeats the previous one, as in LilyPond.
+    """
+    if not duration:
+        return previous
+    base, _, multiplier = duration.partition('*')
+    digits = base.rstrip('.')
+    if not digits:
+        return previous
+    beats = Fraction(4, int(digits))
+    dot = beats
+    for _ in range(len(base) - len(digits)):
+        dot /= 2
+        beats += dot
+    if multiplier.isdigit():
+        beats *= int(multiplier)
+    return beats
+
+def parse_chord_block(chord_block):
+    """
+    Parses the body of a chord section into (symbol, offset, duration)
+    tuples, with offsets and durations in quarter-note beats.
+    """
     chords = []
-    
+    offset = Fraction(0)
+    duration = Fraction(1)
+
     # Split by whitespace, pipes, braces, newlines
     tokens = re.split(r'[\s\|\}\{\n]+', chord_block)
-    
+
     for token in tokens:
         if token.startswith('\\') or not token:
             continue
-            
-        match = chord_pattern.match(token)
+
+        rest = _REST_PATTERN.match(token)
+        if rest:
+            duration = _duration_beats(rest.group(1), duration)
+            offset += duration
+            continue
+
+        match = _CHORD_PATTERN.match(token)
         if match:
             root = match.group(1).upper()
             accidental = match.group(2)
-            duration = match.group(3)
-            quality = match.group(4)
-            
+
             if accidental == 'is':
                 root += '#'
             elif accidental == 'es':
                 root += 'b'
-                
-            q_str = ''
-            if quality:
-                if quality.startswith('m7.5-'):
-                    q_str = 'm7b5'
-                elif quality.startswith('maj7'):
-                    q_str = 'maj7'
-                elif quality.startswith('m7'):
-                    q_str = 'm7'
-                elif quality.startswith('m'):
-                    q_str = 'm'
-                elif quality.startswith('7.9-'):
-                    q_str = '7b9'
-                elif quality.startswith('7'):
-                    q_str = '7'
-                elif quality.startswith('dim'):
-                    q_str = 'dim'
-                else:
-                    q_str = quality
-                    
-            chords.append(f"{root}{q_str}")
+
+            duration = _duration_beats(match.group(3), duration)
+            chords.append((f"{root}{_chord_quality(match.group(4))}", float(offset), float(duration)))
+            offset += duration
 
     return chords
 
+def parse_lilypond_sections(filepath):
+    """
+    Parses every `% if part=='...'` section of a .ly.mako file.
+    Returns {section name: [(symbol, offset, duration), ...]}; when a
+    section appears more than once, the first occurrence wins.
+    """
+    with open(filepath, 'r') as f:
+        content = f.read()
+
+    sections = {}
+    for name, block in _SECTION_PATTERN.findall(content):
+        if name not in sections:
+            sections[name] = parse_chord_block(block)
+    return sections
+
+def parse_lilypond_chords(filepath, version='ChordsReal'):
+    """
+    Parses a LilyPond .ly.mako file to extract chord progressions.
+    Returns a clean list of chord symbols representing the ground truth.
+    """
+    if not os.path.exists(filepath):
+        print(f"Error: Could not find ground truth file {filepath}")
+        return []
+
+    sections = parse_lilypond_sections(filepath)
+    if version not in sections:
+        print(f"Could not find {version} section in {filepath}")
+        return []
+
+    return [symbol for symbol, _, _ in sections[version]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    tune TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chords (
+    file_id INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    version TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    offset REAL NOT NULL,
+    duration REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chords_file ON chords (file_id, version, position);
+CREATE INDEX IF NOT EXISTS files_tune ON files (tune);
+"""
+
+def tune_name(filepath):
+    name = os.path.basename(filepath)
+    return name[:-len(MAKO_SUFFIX)] if name.endswith(MAKO_SUFFIX) else os.path.splitext(name)[0]
+
+class GroundTruthStore:
+    """
+    SQLite store of every chord section (ChordsReal, ChordsFake, ...) of
+    the openbook .ly.mako files, with durations. It is compiled once and
+    refreshed incrementally: only files whose mtime or size changed since
+    the last refresh are re-parsed.
+    """
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(_SCHEMA)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'parser_version'").fetchone()
+        if row is None or int(row[0]) != PARSER_VERSION:
+            with self.conn:
+                self.conn.execute("DELETE FROM files")
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('parser_version', ?)",
+                                  (str(PARSER_VERSION),))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def refresh(self, openbook_dir):
+        """
+        Compiles every .ly.mako file under openbook_dir, skipping unchanged
+        files and dropping entries for files under it that no longer exist.
+        Returns (number of files parsed, number removed).
+        """
+        paths = []
+        for root, _, files in os.walk(openbook_dir):
+            paths.extend(os.path.join(root, f) for f in files if f.endswith(MAKO_SUFFIX))
+        parsed = self.update_files(paths)
+
+        prefix = os.path.join(os.path.abspath(openbook_dir), '')
+        present = set(os.path.abspath(p) for p in paths)
+        stale = [(file_id,) for file_id, path in self.conn.execute("SELECT id, path FROM files")
+                 if path.startswith(prefix) and path not in present]
+        with self.conn:
+            self.conn.executemany("DELETE FROM files WHERE id = ?", stale)
+        return parsed, len(stale)
+
+    def update_files(self, paths):
+        """
+        (Re)compiles the given .ly.mako files if they changed since they were
+        stored. Returns the number of files parsed.
+        """
+        known = {path: (mtime, size) for path, mtime, size in self.conn.execute("SELECT path, mtime, size FROM files")}
+        parsed = 0
+        for path in paths:
+            path = os.path.abspath(path)
+            st = os.stat(path)
+            if known.get(path) == (st.st_mtime, st.st_size):
+                continue
+            sections = {name: chords for name, chords in parse_lilypond_sections(path).items()
+                        if name.startswith(CHORD_SECTION_PREFIX)}
+            with self.conn:
+                self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                file_id = self.conn.execute("INSERT INTO files (path, tune, mtime, size) VALUES (?, ?, ?, ?)",
+                                            (path, tune_name(path), st.st_mtime, st.st_size)).lastrowid
+                self.conn.executemany(
+                    "INSERT INTO chords (file_id, version, position, symbol, offset, duration) VALUES (?, ?, ?, ?, ?, ?)",
+                    ((file_id, version, i, symbol, offset, duration)
+                     for version, chords in sections.items() for i, (symbol, offset, duration) in enumerate(chords)))
+            parsed += 1
+        return parsed
+
+    def tunes(self):
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT tune FROM files ORDER BY tune")]
+
+    def versions(self, tune):
+        return [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT chords.version FROM chords JOIN files ON files.id = chords.file_id "
+            "WHERE files.tune = ? ORDER BY chords.version", (tune,))]
+
+    def _where(self, tune_or_path):
+        if os.sep in tune_or_path or tune_or_path.endswith(MAKO_SUFFIX):
+            return "files.path = ?", os.path.abspath(tune_or_path)
+        return "files.tune = ?", tune_or_path
+
+    def chords_with_durations(self, tune_or_path, version='ChordsReal'):
+        """
+        Returns [(symbol, offset, duration), ...] for a tune name or file path.
+        """
+        where, value = self._where(tune_or_path)
+        return [tuple(row) for row in self.conn.execute(
+            "SELECT chords.symbol, chords.offset, chords.duration FROM chords JOIN files ON files.id = chords.file_id "
+            f"WHERE {where} AND chords.version = ? ORDER BY chords.position", (value, version))]
+
+    def chords(self, tune_or_path, version='ChordsReal'):
+        """
+        Same list of symbols as parse_lilypond_chords, read from the store.
+        """
+        return [symbol for symbol, _, _ in self.chords_with_durations(tune_or_path, version)]
+
+    def load_all(self, version='ChordsReal', key='path'):
+        """
+        Loads one section of every stored file in a single query.
+        Returns {file path (or tune name with key='tune'): [symbols]}.
+        """
+        result = {}
+        for name, symbol in self.conn.execute(
+                f"SELECT files.{'tune' if key == 'tune' else 'path'}, chords.symbol FROM chords "
+                "JOIN files ON files.id = chords.file_id WHERE chords.version = ? "
+                "ORDER BY files.id, chords.position", (version,)):
+            result.setdefault(name, []).append(symbol)
+        return result
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'compile':
+        db_path = sys.argv[2] if len(sys.argv) > 2 else 'ground_truth.db'
+        openbook_dir = sys.argv[3] if len(sys.argv) > 3 else 'data/openbook/src/openbook'
+        with GroundTruthStore(db_path) as store:
+            parsed, removed = store.refresh(openbook_dir)
+            print(f"Compiled {parsed} files ({removed} removed); store has {len(store.tunes())} tunes.")
+        sys.exit(0)
+
     filepath = "data/openbook/src/openbook/autumn_leaves.ly.mako"
     real_chords = parse_lilypond_chords(filepath, version='ChordsReal')
     print("Parsed Ground Truth Chords (Real Book):")
@@ -0,0 +1,92 @@
+from bisect import bisect_right
+import numpy as np
+
+class KeyMap:
+    """
+    Piecewise-constant map from offset to local key. Each key region runs
+    from its start offset up to the next region's start; offsets before the
+    first region use the first key. Lookups use bisect (or searchsorted for
+    whole arrays of offsets), so regions may have any boundaries: fixed
+    windows, overlapping-window centres or detected key changes.
+    """
+    __slots__ = ('starts', 'keys', '_start_array')
+
+    def __init__(self, starts, keys):
+        if len(starts) != len(keys) or not keys:
+            raise ValueError("KeyMap needs one key per region start and at least one region")
+        order = sorted(range(len(starts)), key=lambda i: starts[i])
+        self.starts = [float(starts[i]) for i in order]
+        self.keys = [keys[i] for i in order]
+        self._start_array = np.array(self.starts)
+
+    @classmethod
+    def coerce(cls, local_keys):
+        """
+        Accepts a KeyMap, a {start_offset: Key} dictionary or a single Key.
+        """
+        if isinstance(local_keys, cls):
+            return local_keys
+        if isinstance(local_keys, dict):
+            return cls(list(local_keys.keys()), list(local_keys.values()))
+        return cls([0.0], [local_keys])
+
+    @classmethod
+    def from_changes(cls, changes):
+        """
+        Builds a map from (offset, Key) pairs, merging consecutive regions
+        that have the same key into one change point.
+        """
+        starts, keys = [], []
+        for offset, k in sorted(changes, key=lambda change: change[0]):
+            if keys and str(keys[-1]) == str(k):
+                continue
+            starts.append(offset)
+            keys.append(k)
+        return cls(starts, keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __iter__(self):
+        return iter(self.starts)
+
+    def __getitem__(self, start):
+        return self.keys[self.starts.index(float(start))]
+
+    def items(self):
+        return zip(self.starts, self.keys)
+
+    def values(self):
+        return list(self.keys)
+
+    def get(self, start, default=None):
+        """
+        Dictionary-style lookup of the region starting exactly at `start`.
+        """
+        try:
+            return self[start]
+        except ValueError:
+            return default
+
+    def index_at(self, offset):
+        return max(bisect_right(self.starts, float(offset)) - 1, 0)
+
+    def key_at(self, offset):
+        return self.keys[self.index_at(offset)]
+
+    def indices_at(self, offsets):
+        """
+        Vectorized lookup: returns the region index for each offset.
+        """
+        indices = np.searchsorted(self._start_array, np.asarray(offsets, dtype=float), side='right') - 1
+        return np.maximum(indices, 0)
+
+    def keys_at(self, offsets):
+        return [self.keys[i] for i in self.indices_at(offsets)]
+
+    def segments(self):
+        """
+        Yields (start, end, key) for each region; the last region's end is None.
+        """
+        ends = self.starts[1:] + [None]
+        return zip(self.starts, ends, self.keys)
@@ -1,119 +1,177 @@
-from music21 import chord, stream, instrument, note, harmony
+from fractions import Fraction
+from math import gcd
+import numpy as np
+from music21 import chord
+from src.pcset import REDUCED_MASKS, chord_mask, histogram_masks, tertian_chord, tertian_symbol_figure
+from src.timeline import ChordTimeline
+
+# Bump whenever quantization output changes, to invalidate cached timelines
+QUANTIZER_VERSION = 1
+
+# Shift the grid 0.5 beats earlier to catch 'laid back' jazz entries
+DEFAULT_SHIFT = 0.5
+# Start at beat 4 to skip potential intro/pickup
+DEFAULT_START_OFFSET = 4.0
 
 def _reduce_to_tertian_chord(raw_chord):
     """
     Builds a basic triad/seventh chord based on the root and present intervals.
     """
-    root = raw_chord.root()
-    pitch_classes = set(p.pitchClass for p in raw_chord.pitches)
-    
-    reduced_pitches = [note.Pitch(root.pitchClass)]
-    reduced_pitches[0].octave = 3
-    
-    # Check 3rd
-    has_maj3 = (root.pitchClass + 4) % 12 in pitch_classes
-    has_min3 = (root.pitchClass + 3) % 12 in pitch_classes
-    if has_maj3:
-        p3 = note.Pitch((root.pitchClass + 4) % 12); p3.octave = 4; reduced_pitches.append(p3)
-    elif has_min3:
-        p3 = note.Pitch((root.pitchClass + 3) % 12); p3.octave = 4; reduced_pitches.append(p3)
-        
-    # Check 7th
-    has_min7 = (root.pitchClass + 10) % 12 in pitch_classes
-    has_maj7 = (root.pitchClass + 11) % 12 in pitch_classes
-    if has_maj7:
-        p7 = note.Pitch((root.pitchClass + 11) % 12); p7.octave = 4; reduced_pitches.append(p7)
-    elif has_min7:
-        p7 = note.Pitch((root.pitchClass + 10) % 12); p7.octave = 4; reduced_pitches.append(p7)
-
-    # Check 5th
-    has_dim5 = (root.pitchClass + 6) % 12 in pitch_classes
-    has_aug5 = (root.pitchClass + 8) % 12 in pitch_classes
-    has_perf5 = (root.pitchClass + 7) % 12 in pitch_classes
-    
-    if has_dim5 and not has_perf5:
-        p5 = note.Pitch((root.pitchClass + 6) % 12); p5.octave = 4; reduced_pitches.append(p5)
-    elif has_aug5 and not has_perf5:
-        p5 = note.Pitch((root.pitchClass + 8) % 12); p5.octave = 4; reduced_pitches.append(p5)
-    else: 
-        p5 = note.Pitch((root.pitchClass + 7) % 12); p5.octave = 4; reduced_pitches.append(p5)
-        
-    return chord.Chord(reduced_pitches)
-
-def quantize_harmony(score, beats_per_chord=4.0):
+    return tertian_chord(raw_chord.root().pitchClass, chord_mask(raw_chord))
+
+# Tolerance for comparing float offsets against the 0.5 beat overlap threshold
+_EPSILON = 1e-9
+
+def _note_arrays(score):
     """
-    Groups notes from a score into structural chords aligned to a grid.
+    Flattens a score (or a source.NoteTable) into onset-sorted NumPy arrays
+    with one row per sounding pitch: (onsets, ends, midi numbers, highest time).
     """
-    quantized_stream = stream.Part()
-    # Apply a small offset shift (0.5 beats) to catch 'laid back' jazz entries
-    shift = 0.5
-    total_length = score.highestTime
-    all_elements = score.flatten().notes
-    
-    current_offset = 4.0 # Start at beat 4 to skip potential intro/pickup
+    if hasattr(score, 'onset') and hasattr(score, 'pitch'):
+        onsets = np.asarray(score.onset, dtype=float)
+        ends = onsets + np.asarray(score.duration, dtype=float)
+        midi = np.asarray(score.pitch, dtype=np.int64)
+        total_length = score.highest_time
+    else:
+        rows = []
+        for el in score.flatten().notes:
+            onset = float(el.offset)
+            end = onset + float(el.duration.quarterLength)
+            rows.extend((onset, end, p.midi) for p in el.pitches)
+        data = np.array(rows, dtype=float).reshape(-1, 3)
+        onsets, ends, midi = data[:, 0], data[:, 1], data[:, 2].astype(np.int64)
+        total_length = float(score.highestTime)
+
+    order = np.argsort(onsets, kind='stable')
+    return onsets[order], ends[order], midi[order], total_length
+
+def _bucket_offsets(total_length, beats_per_chord, start_offset):
+    offsets = []
+    current_offset = start_offset
     while current_offset <= total_length:
-        window_start = current_offset + shift
-        window_end = current_offset + beats_per_chord + shift
-        
-        # 1. Collect all pitches in this window
-        window_pitches = []
-        for el in all_elements:
-            el_end = el.offset + el.duration.quarterLength
-            if el.offset < window_end and el_end > window_start:
-                if min(el_end, window_end) - max(el.offset, window_start) >= 0.5:
-                    if hasattr(el, 'pitches'): window_pitches.extend(el.pitches)
-                    elif hasattr(el, 'pitch'): window_pitches.append(el.pitch)
-
-        if window_pitches:
-            # 2. Find the anchor bass (the root)
-            # Find the notes that start earliest in this window
-            valid_elements = [el for el in all_elements if (hasattr(el, 'pitch') or hasattr(el, 'pitches')) and el.offset < window_end and (el.offset + el.duration.quarterLength) > window_start and (min(el.offset + el.duration.quarterLength, window_end) - max(el.offset, window_start)) >= 0.5]
-            
-            if valid_elements:
-                earliest_offset = min(el.offset for el in valid_elements)
-                
-                # Allow a small 0.5 beat margin to catch simultaneously struck notes
-                earliest_pitches = []
-                for el in valid_elements:
-                    if el.offset <= earliest_offset + 0.5:
-                        if hasattr(el, 'pitches'): earliest_pitches.extend(el.pitches)
-                        elif hasattr(el, 'pitch'): earliest_pitches.append(el.pitch)
-
-                if earliest_pitches:
-                    earliest_pitches.sort(key=lambda p: p.midi)
-                    anchor_bass = earliest_pitches[0]
-                else:
-                    window_pitches.sort(key=lambda p: p.midi)
-                    anchor_bass = window_pitches[0]
-            else:
-                window_pitches.sort(key=lambda p: p.midi)
-                anchor_bass = window_pitches[0]
-
-            unique_pcs = sorted(list(set(p.pitchClass for p in window_pitches)))
-            reduced_pitches = []
-            for pc in unique_pcs:
-                p = note.Pitch(pc)
-                p.octave = 3 if pc == anchor_bass.pitchClass else 4
-                reduced_pitches.append(p)
-            
-            raw_chord = chord.Chord(reduced_pitches)
-            raw_chord.root(anchor_bass)
-            
-            clean_chord = _reduce_to_tertian_chord(raw_chord)
-            clean_chord.duration.quarterLength = beats_per_chord
-            
-            try:
-                sym = harmony.chordSymbolFigureFromChord(clean_chord)
-                if sym != 'Chord Symbol Cannot Be Identified':
-                    clean_chord.chord_symbol_figure = sym
-            except:
-                pass
-            
-            quantized_stream.insert(current_offset, clean_chord)
-            
+        offsets.append(current_offset)
         current_offset += beats_per_chord
-        
-    return quantized_stream
+    return np.array(offsets, dtype=float)
+
+def _overlap_pairs(onsets, ends, window_starts, window_ends):
+    """
+    Sparse notes-by-windows overlap matrix. Returns parallel arrays
+    (note_idx, window_idx, overlap) with one entry for every note/window pair
+    that intersect, built with searchsorted/repeat instead of Python loops.
+    """
+    first = np.searchsorted(window_ends, onsets, side='right')
+    last = np.searchsorted(window_starts, ends, side='left')
+    counts = np.maximum(last - first, 0)
+
+    note_idx = np.repeat(np.arange(len(onsets)), counts)
+    run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+    window_idx = np.arange(len(note_idx)) - run_starts + np.repeat(first, counts)
+
+    overlap = np.minimum(ends[note_idx], window_ends[window_idx]) - np.maximum(onsets[note_idx], window_starts[window_idx])
+    return note_idx, window_idx, overlap
+
+def _base_resolution(resolutions):
+    """
+    Returns the finest grid (in beats) that every requested resolution is a whole multiple of.
+    """
+    fractions = [Fraction(r).limit_denominator(96) for r in resolutions]
+    denominator = 1
+    for f in fractions:
+        denominator = denominator * f.denominator // gcd(denominator, f.denominator)
+    numerator = 0
+    for f in fractions:
+        numerator = gcd(numerator, f.numerator * (denominator // f.denominator))
+    return numerator / denominator
+
+def _multi_resolution_summaries(onsets, ends, midi, total_length, resolutions, shift, start_offset):
+    """
+    Computes bucket summaries for several resolutions from one traversal.
+    Note/window overlaps are computed once on the finest common grid; coarser
+    buckets sum the overlaps of the fine buckets they cover per note, so the
+    0.5 beat threshold and the anchor bass are evaluated exactly as if each
+    resolution had been quantized on its own.
+    Returns {resolution: (offsets, histograms, anchors)}.
+    """
+    base = _base_resolution(resolutions)
+    bucket_offsets = {r: _bucket_offsets(total_length, r, start_offset) for r in resolutions}
+    multiples = {r: int(round(r / base)) for r in resolutions}
+    num_base = max((len(bucket_offsets[r]) * multiples[r] for r in resolutions), default=0)
+
+    base_offsets = start_offset + np.arange(num_base) * base
+    note_idx, base_idx, base_overlap = _overlap_pairs(onsets, ends, base_offsets + shift, base_offsets + base + shift)
+
+    summaries = {}
+    for r in resolutions:
+        offsets = bucket_offsets[r]
+        window_idx = base_idx // multiples[r]
+        in_range = window_idx < len(offsets)
+        notes, windows, overlap = note_idx[in_range], window_idx[in_range], base_overlap[in_range]
+
+        if multiples[r] > 1 and len(notes):
+            # Pairs are ordered by note then window, so each (note, bucket) group is contiguous
+            group_key = notes * len(offsets) + windows
+            group_starts = np.flatnonzero(np.r_[True, np.diff(group_key) != 0])
+            notes, windows = notes[group_starts], windows[group_starts]
+            overlap = np.add.reduceat(overlap, group_starts)
+
+        valid = overlap >= 0.5 - _EPSILON
+        histograms, anchors = _summarize_pairs(onsets, midi, notes[valid], windows[valid], overlap[valid], len(offsets))
+        summaries[r] = (offsets, histograms, anchors)
+    return summaries
+
+def _summarize_pairs(onsets, midi, note_idx, window_idx, overlap, num_windows):
+    pcs = midi[note_idx] % 12
+    histograms = np.bincount(window_idx * 12 + pcs, weights=overlap, minlength=num_windows * 12).reshape(num_windows, 12)
+
+    # The anchor bass is the lowest note among those struck within 0.5 beats
+    # of the earliest onset in the bucket (to catch simultaneously struck notes)
+    pair_onsets = onsets[note_idx]
+    earliest = np.full(num_windows, np.inf)
+    np.minimum.at(earliest, window_idx, pair_onsets)
+    eligible = pair_onsets <= earliest[window_idx] + 0.5
+
+    anchors = np.full(num_windows, np.iinfo(np.int64).max)
+    np.minimum.at(anchors, window_idx[eligible], midi[note_idx[eligible]])
+    anchors[anchors == np.iinfo(np.int64).max] = -1
+    return histograms, anchors
+
+def _build_timeline(offsets, histograms, anchors, beats_per_chord):
+    """
+    Collects the non-empty buckets into a ChordTimeline of their tertian reductions.
+    """
+    filled = np.flatnonzero(anchors >= 0)
+    roots = anchors[filled] % 12
+    masks = REDUCED_MASKS[roots, histogram_masks(histograms[filled])]
+    figures = [tertian_symbol_figure(root, mask) for root, mask in zip(roots, masks)]
+    durations = np.full(len(filled), float(beats_per_chord))
+    return ChordTimeline.from_figures(offsets[filled], durations, roots, masks, figures)
+
+def quantize_harmony_multi(score, resolutions=(1.0, 2.0, 4.0), as_timeline=False,
+                           shift=DEFAULT_SHIFT, start_offset=DEFAULT_START_OFFSET):
+    """
+    Quantizes a score at several bucket sizes (in beats) in a single pass.
+    Returns a dictionary mapping each resolution to its quantized Part
+    (or ChordTimeline if as_timeline is True), identical to calling
+    quantize_harmony once per resolution.
+    """
+    onsets, ends, midi, total_length = _note_arrays(score)
+    summaries = _multi_resolution_summaries(onsets, ends, midi, total_length, list(resolutions), shift, start_offset)
+    results = {}
+    for r, (offsets, histograms, anchors) in summaries.items():
+        # Only materialize music21 objects when a Part is requested
+        timeline = _build_timeline(offsets, histograms, anchors, r)
+        results[r] = timeline if as_timeline else timeline.to_part()
+    return results
+
+def quantize_harmony(score, beats_per_chord=4.0, as_timeline=False, shift=DEFAULT_SHIFT, start_offset=DEFAULT_START_OFFSET):
+    """
+    Groups notes from a score into structural chords aligned to a grid.
+    Accepts a music21 score or a source.NoteTable. Returns a music21 Part,
+    or a compact timeline.ChordTimeline if as_timeline is True.
+    `shift` moves the grid earlier (in beats) and `start_offset` is the
+    first grid line.
+    """
+    return quantize_harmony_multi(score, [beats_per_chord], as_timeline, shift, start_offset)[beats_per_chord]
 
 def extract_chords(score):
     """
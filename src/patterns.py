@@ -0,0 +1,188 @@
+from collections import deque
+from src.pcset import chord_mask
+from src.timeline import ChordTimeline
+
+class ProgressionPattern:
+    """
+    A named chord progression described by the root motion between
+    consecutive chords (semitones up, mod 12) and/or by the scale degrees
+    of its roots. `qualities` optionally constrains each chord's quality
+    (see chord_quality); None entries match anything.
+    """
+    def __init__(self, name, intervals=None, degrees=None, qualities=None):
+        if intervals is None and degrees is None:
+            raise ValueError(f"Pattern {name} needs intervals or degrees")
+        self.name = name
+        self.intervals = tuple(i % 12 for i in intervals) if intervals is not None else None
+        self.degrees = tuple(degrees) if degrees is not None else None
+        self.qualities = tuple(qualities) if qualities is not None else None
+
+    def __len__(self):
+        """Number of chords the pattern spans."""
+        return len(self.degrees) if self.degrees is not None else len(self.intervals) + 1
+
+def chord_quality(root_pc, mask):
+    """
+    Classifies a chord by the intervals above its root:
+    'dominant', 'major', 'minor', 'half-diminished', 'diminished' or 'other'.
+    """
+    if root_pc is None or root_pc < 0:
+        return None
+    has = lambda semitones: bool(mask & (1 << ((root_pc + semitones) % 12)))
+    if has(4):
+        return 'dominant' if has(10) else 'major'
+    if has(3):
+        if has(6) and not has(7):
+            return 'half-diminished' if has(10) else 'diminished'
+        return 'minor'
+    return 'other'
+
+class _Automaton:
+    """
+    Aho-Corasick automaton over a token alphabet: finds every occurrence of
+    every registered token sequence in one left-to-right pass.
+    """
+    def __init__(self, sequences):
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for pattern_id, sequence in sequences:
+            state = 0
+            for token in sequence:
+                if token not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                    self.goto[state][token] = len(self.goto) - 1
+                state = self.goto[state][token]
+            self.outputs[state].append((pattern_id, len(sequence)))
+
+        # Breadth-first construction of failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(token, 0)
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def step(self, state, token):
+        """
+        Advances by one token, returning (new state, [(pattern_id, length), ...]).
+        A None token (e.g. a chord without a root) resets the automaton.
+        """
+        if token is None:
+            return 0, []
+        while state and token not in self.goto[state]:
+            state = self.fail[state]
+        state = self.goto[state].get(token, 0)
+        return state, self.outputs[state]
+
+def progression_tokens(progression):
+    """
+    Precomputes the per-chord root pitch classes (None when a chord has no
+    usable root), scale degrees and qualities of a list of RomanNumerals or
+    an analyzed ChordTimeline.
+    """
+    if isinstance(progression, ChordTimeline):
+        roots = progression.root_pc.tolist()
+        degrees = [d if d > 0 else None for d in progression.scale_degree.tolist()]
+        masks = progression.pc_mask.tolist()
+    else:
+        roots, degrees, masks = [], [], []
+        for rn in progression:
+            degrees.append(getattr(rn, 'scaleDegree', None))
+            try:
+                roots.append(rn.root().pitchClass)
+                masks.append(chord_mask(rn))
+            except Exception:
+                # If the chord is too mangled to have a root, it breaks any match
+                roots.append(None)
+                masks.append(0)
+    qualities = [chord_quality(r, m) for r, m in zip(roots, masks)]
+    return roots, degrees, qualities
+
+class PatternMatcher:
+    """
+    Compiles a library of ProgressionPatterns into two Aho-Corasick automata
+    (one over root-motion intervals, one over scale degrees) and reports
+    every match of every pattern in a single O(n) pass over a progression.
+    """
+    def __init__(self, patterns=()):
+        self.patterns = []
+        self._compiled = None
+        for pattern in patterns:
+            self.register(pattern)
+
+    def register(self, pattern, **kwargs):
+        """
+        Adds a pattern, given as a ProgressionPattern or as a name plus
+        ProgressionPattern keyword arguments. Several patterns may share a
+        name; their matches are merged.
+        """
+        if not isinstance(pattern, ProgressionPattern):
+            pattern = ProgressionPattern(pattern, **kwargs)
+        self.patterns.append(pattern)
+        self._compiled = None
+        return pattern
+
+    @property
+    def names(self):
+        return list(dict.fromkeys(p.name for p in self.patterns))
+
+    def _compile(self):
+        if self._compiled is None:
+            interval_automaton = _Automaton((i, p.intervals) for i, p in enumerate(self.patterns) if p.intervals is not None)
+            degree_automaton = _Automaton((i, p.degrees) for i, p in enumerate(self.patterns) if p.degrees is not None)
+            self._compiled = (interval_automaton, degree_automaton)
+        return self._compiled
+
+    def scan(self, progression):
+        """
+        Finds all pattern matches in a list of RomanNumerals or an analyzed
+        ChordTimeline. Returns {pattern name: sorted list of start indices}.
+        """
+        interval_automaton, degree_automaton = self._compile()
+        roots, degrees, qualities = progression_tokens(progression)
+
+        found = {name: set() for name in self.names}
+        interval_state = degree_state = 0
+        for i in range(len(roots)):
+            degree_state, degree_hits = degree_automaton.step(degree_state, degrees[i])
+            hits = [(pattern_id, i - length + 1) for pattern_id, length in degree_hits]
+            if i > 0:
+                interval = (roots[i] - roots[i-1]) % 12 if roots[i] is not None and roots[i-1] is not None else None
+                interval_state, interval_hits = interval_automaton.step(interval_state, interval)
+                # An interval sequence of length L spans L + 1 chords ending at chord i
+                hits.extend((pattern_id, i - length) for pattern_id, length in interval_hits)
+
+            for pattern_id, start in hits:
+                pattern = self.patterns[pattern_id]
+                if pattern.qualities is None or all(
+                        q is None or q == qualities[start + k] for k, q in enumerate(pattern.qualities)):
+                    found[pattern.name].add(start)
+
+        return {name: sorted(starts) for name, starts in found.items()}
+
+DEFAULT_PATTERNS = [
+    ProgressionPattern('ii-V-I', degrees=(2, 5, 1)),
+    ProgressionPattern('ii-V-I', intervals=(5, 5)),
+    ProgressionPattern('ii-subV-I', intervals=(11, 11)),
+    ProgressionPattern('I-vi-ii-V', intervals=(9, 5, 5)),
+    ProgressionPattern('iii-VI-ii-V', intervals=(5, 5, 5)),
+    ProgressionPattern('backdoor ii-V', intervals=(5, 2), qualities=('minor', 'dominant', None)),
+    ProgressionPattern('Coltrane changes', intervals=(3, 5, 3, 5)),
+]
+
+# Shared matcher used by analyze.identify_ii_v_i and friends; register custom patterns here
+default_matcher = PatternMatcher(DEFAULT_PATTERNS)
+
+def find_progressions(progression, matcher=default_matcher):
+    """
+    Scans a list of RomanNumerals or an analyzed ChordTimeline for every
+    pattern known to the matcher. Returns {pattern name: [start indices]}.
+    """
+    return matcher.scan(progression)
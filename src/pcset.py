@@ -0,0 +1,107 @@
+import numpy as np
+from music21 import chord, note, harmony
+
+# Pitch-class sets are stored as 12-bit integers: bit n is set when pitch class n is present.
+NUM_MASKS = 1 << 12
+_BITS = 1 << np.arange(12)
+
+def pitch_class_mask(pitch_classes):
+    """
+    Packs an iterable of pitch classes into a 12-bit mask.
+    """
+    mask = 0
+    for pc in pitch_classes:
+        mask |= 1 << (int(pc) % 12)
+    return mask
+
+def chord_mask(chord_obj):
+    """
+    Returns the 12-bit pitch-class mask of a music21 chord.
+    """
+    return pitch_class_mask(p.pitchClass for p in chord_obj.pitches)
+
+def mask_to_pitch_classes(mask):
+    return [pc for pc in range(12) if mask & (1 << pc)]
+
+def histogram_masks(histograms):
+    """
+    Converts an (n, 12) array of pitch-class weights into n masks.
+    """
+    return (np.asarray(histograms) > 0).astype(np.int64) @ _BITS
+
+def _rotate(masks, shift):
+    shift %= 12
+    return ((masks >> shift) | (masks << (12 - shift))) & (NUM_MASKS - 1)
+
+def _build_tertian_tables():
+    """
+    Precomputes, for every (root, mask) pair, the intervals above the root
+    of the reduced tertian chord: (third, seventh, fifth), 0 meaning absent.
+    """
+    thirds = np.zeros((12, NUM_MASKS), dtype=np.int8)
+    sevenths = np.zeros((12, NUM_MASKS), dtype=np.int8)
+    fifths = np.zeros((12, NUM_MASKS), dtype=np.int8)
+    masks = np.arange(NUM_MASKS)
+    for root in range(12):
+        rel = _rotate(masks, root)
+        has = lambda interval: (rel >> interval) & 1 == 1
+        thirds[root] = np.where(has(4), 4, np.where(has(3), 3, 0))
+        sevenths[root] = np.where(has(11), 11, np.where(has(10), 10, 0))
+        fifths[root] = np.where(has(6) & ~has(7), 6, np.where(has(8) & ~has(7), 8, 7))
+    return thirds, sevenths, fifths
+
+_THIRDS, _SEVENTHS, _FIFTHS = _build_tertian_tables()
+
+def _interval_bit(root, interval):
+    return np.where(interval > 0, 1 << ((root + interval) % 12), 0)
+
+_ROOTS = np.arange(12)[:, None]
+# REDUCED_MASKS[root, mask] is the mask of the tertian reduction (root, 3rd, 5th, 7th)
+REDUCED_MASKS = ((1 << _ROOTS)
+                 | _interval_bit(_ROOTS, _THIRDS.astype(np.int64))
+                 | _interval_bit(_ROOTS, _SEVENTHS.astype(np.int64))
+                 | _interval_bit(_ROOTS, _FIFTHS.astype(np.int64))).astype(np.uint16)
+
+def reduce_to_tertian(root_pc, mask):
+    """
+    O(1) tertian reduction: returns the reduced chord's pitch classes in
+    voicing order (root, 3rd, 7th, 5th), skipping a missing 3rd or 7th.
+    """
+    root_pc = int(root_pc) % 12
+    pcs = [root_pc]
+    for table in (_THIRDS, _SEVENTHS, _FIFTHS):
+        interval = int(table[root_pc, mask])
+        if interval:
+            pcs.append((root_pc + interval) % 12)
+    return pcs
+
+def tertian_chord(root_pc, mask):
+    """
+    Builds the reduced music21 chord with the root in octave 3 and the
+    upper structure in octave 4.
+    """
+    pitches = []
+    for i, pc in enumerate(reduce_to_tertian(root_pc, mask)):
+        p = note.Pitch(pc)
+        p.octave = 3 if i == 0 else 4
+        pitches.append(p)
+    return chord.Chord(pitches)
+
+# Symbol figures only depend on the reduced chord, of which there are at most
+# 12 roots x 27 shapes, so they are resolved through music21 once each.
+_FIGURES = {}
+
+def tertian_symbol_figure(root_pc, mask):
+    """
+    Returns the chord symbol figure of the tertian reduction of (root, mask),
+    or None when music21 cannot name it.
+    """
+    root_pc = int(root_pc) % 12
+    key = (root_pc, int(REDUCED_MASKS[root_pc, mask]))
+    if key not in _FIGURES:
+        try:
+            sym = harmony.chordSymbolFigureFromChord(tertian_chord(root_pc, mask))
+        except Exception:
+            sym = None
+        _FIGURES[key] = sym if sym != 'Chord Symbol Cannot Be Identified' else None
+    return _FIGURES[key]
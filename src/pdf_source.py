@@ -3,11 +3,16 @@ import cv2
 import numpy as np
 import fitz  # PyMuPDF
 import pytesseract
-from PIL import Image
-import io
+import hashlib
+import json
 import subprocess
+from functools import lru_cache
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from src.pdf_parse import align_chords_to_staves
-from src.ai_vision import extract_chords_with_ai
+from src.staff_detection import detect_staff_layout
+from src.ai_vision import AI_MODEL, ChordExtraction, extract_chords_with_ai
+from src.cache import DiskCache
 from music21 import stream, converter
 
 def run_omr(img_path):
@@ -30,13 +35,182 @@ def run_omr(img_path):
         print(f"OMR failed for {img_path}: {e}")
     return None
 
-def load_pdf(file_path, include_melody=True, use_ai_chords=True):
+def pixmap_array(pix):
+    """
+    Wraps a PyMuPDF Pixmap's samples as a (height, width[, channels]) uint8
+    array without copying. The array is only valid while `pix` is alive.
+    """
+    rows = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)
+    img = rows[:, :pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+    return img[:, :, 0] if pix.n == 1 else img
+
+# Bump when the raw OCR/AI token extraction changes, to invalidate cached strip results
+EXTRACTOR_VERSION = 1
+
+@lru_cache(maxsize=None)
+def _tesseract_version():
+    return str(pytesseract.get_tesseract_version())
+
+def _strip_key(strip, extractor):
+    """
+    Cache key for an extractor's result on a strip: a hash of the strip's
+    pixels and shape plus the extractor name and version.
+    """
+    digest = hashlib.sha256(np.ascontiguousarray(strip).tobytes()).hexdigest()
+    return DiskCache.make_key('strip', extractor, EXTRACTOR_VERSION, digest, strip.shape)
+
+def ocr_tokens(strip, cache=None):
+    """
+    Runs Tesseract on a chord strip and returns its non-empty words as
+    [{'text', 'x', 'w'}, ...]. Results are memoized in `cache` (a DiskCache).
+    """
+    key = _strip_key(strip, f"tesseract-{_tesseract_version()}") if cache is not None else None
+    if key is not None:
+        cached = cache.get_bytes(key)
+        if cached is not None:
+            return json.loads(cached)
+
+    tokens = []
+    ocr_data = pytesseract.image_to_data(strip, output_type=pytesseract.Output.DICT)
+    for i in range(len(ocr_data['text'])):
+        text = ocr_data['text'][i].strip()
+        if not text: continue
+        tokens.append({'text': text, 'x': ocr_data['left'][i], 'w': ocr_data['width'][i]})
+
+    if key is not None:
+        cache.put_bytes(key, json.dumps(tokens).encode())
+    return tokens
+
+def ai_chords(strip, cache=None):
+    """
+    Extracts the chords of a strip with extract_chords_with_ai, memoizing
+    non-empty results in `cache` (empty lists may be transient API failures).
+    Returns a list of ChordExtraction.
+    """
+    key = _strip_key(strip, f"ai-{AI_MODEL}") if cache is not None else None
+    if key is not None:
+        cached = cache.get_bytes(key)
+        if cached is not None:
+            return [ChordExtraction(**c) for c in json.loads(cached)]
+
+    chords = extract_chords_with_ai(strip)
+    if key is not None and chords:
+        cache.put_bytes(key, json.dumps([c.model_dump() for c in chords]).encode())
+    return chords
+
+# align_chords_to_staves lays every measure out in 4/4
+BEATS_PER_MEASURE = 4.0
+
+def _process_page(file_path, page_idx, include_melody=True, use_ai_chords=True, doc=None, cache=None):
+    """
+    Transcribes one page of a PDF with its own measure numbering starting at 0.
+    Returns (chord elements, number of measures, melody elements), where the
+    elements are (page-local offset, music21 object) pairs. Opens the PDF
+    itself unless `doc` is given, so it can run in a worker process.
+    OCR/AI results per chord strip are memoized in `cache` (a DiskCache).
+    """
+    if doc is None:
+        doc = fitz.open(file_path)
+    page = doc[page_idx]
+    print(f"Processing page {page_idx + 1}/{doc.page_count}...")
+
+    # 1. Render to a grayscale image, viewed in place as a NumPy array
+    # (keep `pix` alive for as long as `gray` is used: the array borrows its buffer)
+    pix = page.get_pixmap(dpi=300, colorspace=fitz.csGRAY)
+    gray = pixmap_array(pix)
+
+    # 2. Detect barlines and systems (needed for alignment) on a downsampled copy;
+    # the full-resolution page is only used for the chord strips below
+    systems, system_bars = detect_staff_layout(gray, page_dpi=300)
+    width = gray.shape[1]
+    
+    # 3. Chord Extraction (AI or OCR)
+    page_chords = []
+    
+    for sys_idx, (sys_top, sys_bot) in enumerate(systems):
+        # Crop a horizontal slice from 150px above the staff to the top of the staff
+        crop_top = max(0, sys_top - 150)
+        if sys_idx > 0:
+            crop_top = max(crop_top, systems[sys_idx-1][1] + 10)
+        
+        sys_slice = gray[crop_top:sys_top]
+
+        if use_ai_chords and os.environ.get("GEMINI_API_KEY"):
+            print(f"  AI extracting chords for system {sys_idx}...")
+            for ac in ai_chords(sys_slice, cache):
+                page_chords.append({
+                    'text': ac.chord_symbol,
+                    'x': ac.horizontal_percentage * width,
+                    'w': 50, # Approximate width
+                    'system': sys_idx
+                })
+        else:
+            # Fallback to Tesseract OCR
+            print(f"  OCR extracting chords for system {sys_idx}...")
+            for token in ocr_tokens(sys_slice, cache):
+                page_chords.append(dict(token, system=sys_idx))
+    
+    # 3.5 Grouping and Aligning Chords
+    grouped_chords = []
+    if page_chords:
+        page_chords.sort(key=lambda c: (c['system'], c['x']))
+        curr = page_chords[0]
+        for nxt in page_chords[1:]:
+            bars = system_bars.get(curr['system'], [])
+            if nxt['system'] == curr['system'] and \
+               not any(curr['x'] + curr.get('w', 0) < bx < nxt['x'] for bx in bars) and \
+               nxt['x'] - (curr['x'] + curr.get('w', 0)) < 40:
+                curr['text'] += nxt['text']
+                curr['w'] = (nxt['x'] + nxt.get('w', 0)) - curr['x']
+            else:
+                grouped_chords.append(curr)
+                curr = nxt
+        grouped_chords.append(curr)
+    
+    page_chord_part, num_measures = align_chords_to_staves(grouped_chords, systems, system_bars, start_measure=0)
+    chord_elements = [(el.offset, el) for el in page_chord_part.flatten()]
+    
+    # 4. Optional OMR Pass for Melody
+    melody_elements = []
+    if include_melody:
+        # oemer only reads files, so this is the one place the page is written to disk
+        with tempfile.TemporaryDirectory(prefix='jazz_omr_') as tmp_dir:
+            img_path = os.path.join(tmp_dir, f"page_{page_idx}.png")
+            cv2.imwrite(img_path, gray)
+            page_score = run_omr(img_path)
+        if page_score:
+            for p in page_score.parts:
+                for el in p.flatten():
+                    if el.classSortOrder >= 0:
+                        melody_elements.append((el.offset, el))
+
+    return chord_elements, num_measures, melody_elements
+
+def _process_page_worker(args):
+    file_path, page_idx, include_melody, use_ai_chords, cache = args
+    return _process_page(file_path, page_idx, include_melody, use_ai_chords, cache=cache)
+
+def load_pdf(file_path, include_melody=True, use_ai_chords=True, workers=1, cache=None):
     """
     Loads a scanned PDF lead sheet, extracts staff lines and chord symbols via OCR/OMR/AI,
     and returns a music21 Score object populated with the identified harmony and melody.
+    With workers > 1 (or None for one per CPU), pages are transcribed in a
+    process pool and stitched together in page order afterwards.
+    Pass a DiskCache as `cache` to reuse OCR/AI results for unchanged chord strips.
     """
     try:
         doc = fitz.open(file_path)
+        page_count = doc.page_count
+
+        if workers == 1 or page_count < 2:
+            pages = [_process_page(file_path, page_idx, include_melody, use_ai_chords, doc=doc, cache=cache)
+                     for page_idx in range(page_count)]
+        else:
+            doc.close()
+            tasks = [(file_path, page_idx, include_melody, use_ai_chords, cache) for page_idx in range(page_count)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pages = list(pool.map(_process_page_worker, tasks))
+
         combined_score = stream.Score()
         
         # We'll use one part for melody and one for chords if OMR is enabled
@@ -45,135 +219,15 @@ def load_pdf(file_path, include_melody=True, use_ai_chords=True):
         chord_part = stream.Part()
         chord_part.id = 'Chords'
         
+        # Each page numbers its measures from 0; shift them by the measures on the preceding pages
         current_measure = 0
-        
-        for page_idx in range(doc.page_count):
-            page = doc[page_idx]
-            print(f"Processing page {page_idx + 1}/{doc.page_count}...")
-            
-            # 1. Render to image
-            pix = page.get_pixmap(dpi=300)
-            img_path = f"tmp_page_{page_idx}.png"
-            pix.save(img_path)
-            
-            # 2. Detect barlines and systems (needed for alignment)
-            img_data = pix.tobytes("png")
-            nparr = np.frombuffer(img_data, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 2)
-            
-            width = img.shape[1]
-            horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (width // 40, 1))
-            detect_horizontal = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
-            cnts = cv2.findContours(detect_horizontal, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            cnts = cnts[0] if len(cnts) == 2 else cnts[1]
-            
-            horizontal_lines = sorted([cv2.boundingRect(c)[1] for c in cnts if cv2.boundingRect(c)[2] > width // 4])
-            systems = []
-            if horizontal_lines:
-                current_system = [horizontal_lines[0]]
-                for y in horizontal_lines[1:]:
-                    if y - current_system[-1] < 60:
-                        current_system.append(y)
-                    else:
-                        systems.append((current_system[0], current_system[-1]))
-                        current_system = [y]
-                systems.append((current_system[0], current_system[-1]))
-                
-            vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 40))
-            detect_vertical = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
-            cnts = cv2.findContours(detect_vertical, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            cnts = cnts[0] if len(cnts) == 2 else cnts[1]
-            
-            system_bars = {i: [] for i in range(len(systems))}
-            for c in cnts:
-                x, y, w, h = cv2.boundingRect(c)
-                if 40 < h < 300:
-                    mid_y = y + (h/2)
-                    for i, (sys_top, sys_bot) in enumerate(systems):
-                        if sys_top - 20 <= mid_y <= sys_bot + 20:
-                            if not any(abs(bx - x) < 20 for bx in system_bars[i]):
-                                system_bars[i].append(x)
-                            break
-            for i in system_bars: system_bars[i].sort()
-            
-            # 3. Chord Extraction (AI or OCR)
-            page_chords = []
-            pil_img = Image.open(io.BytesIO(img_data))
-            
-            for sys_idx, (sys_top, sys_bot) in enumerate(systems):
-                # Crop a horizontal slice from 150px above the staff to the top of the staff
-                crop_top = max(0, sys_top - 150)
-                if sys_idx > 0:
-                    crop_top = max(crop_top, systems[sys_idx-1][1] + 10)
-                
-                crop_box = (0, crop_top, pil_img.width, sys_top)
-                sys_slice_path = f"tmp_sys_{page_idx}_{sys_idx}.png"
-                pil_img.crop(crop_box).save(sys_slice_path)
-
-                if use_ai_chords and os.environ.get("GEMINI_API_KEY"):
-                    print(f"  AI extracting chords for system {sys_idx}...")
-                    ai_chords = extract_chords_with_ai(sys_slice_path)
-                    for ac in ai_chords:
-                        page_chords.append({
-                            'text': ac.chord_symbol,
-                            'x': ac.horizontal_percentage * pil_img.width,
-                            'w': 50, # Approximate width
-                            'system': sys_idx
-                        })
-                else:
-                    # Fallback to Tesseract OCR
-                    print(f"  OCR extracting chords for system {sys_idx}...")
-                    ocr_data = pytesseract.image_to_data(Image.open(sys_slice_path), output_type=pytesseract.Output.DICT)
-                    for i in range(len(ocr_data['text'])):
-                        text = ocr_data['text'][i].strip()
-                        if not text: continue
-                        page_chords.append({
-                            'text': text,
-                            'x': ocr_data['left'][i],
-                            'w': ocr_data['width'][i],
-                            'system': sys_idx
-                        })
-                
-                if os.path.exists(sys_slice_path):
-                    os.remove(sys_slice_path)
-            
-            # 3.5 Grouping and Aligning Chords
-            grouped_chords = []
-            if page_chords:
-                page_chords.sort(key=lambda c: (c['system'], c['x']))
-                curr = page_chords[0]
-                for nxt in page_chords[1:]:
-                    bars = system_bars.get(curr['system'], [])
-                    if nxt['system'] == curr['system'] and \
-                       not any(curr['x'] + curr.get('w', 0) < bx < nxt['x'] for bx in bars) and \
-                       nxt['x'] - (curr['x'] + curr.get('w', 0)) < 40:
-                        curr['text'] += nxt['text']
-                        curr['w'] = (nxt['x'] + nxt.get('w', 0)) - curr['x']
-                    else:
-                        grouped_chords.append(curr)
-                        curr = nxt
-                grouped_chords.append(curr)
-            
-            page_chord_part, next_measure = align_chords_to_staves(grouped_chords, systems, system_bars, start_measure=current_measure)
-            for el in page_chord_part.flatten():
-                chord_part.insert(el.offset, el)
-            
-            # 4. Optional OMR Pass for Melody
-            if include_melody:
-                page_score = run_omr(img_path)
-                if page_score:
-                    shift = current_measure * 4.0
-                    for p in page_score.parts:
-                        for el in p.flatten():
-                            if el.classSortOrder >= 0:
-                                melody_part.insert(el.offset + shift, el)
-                                
-            if os.path.exists(img_path):
-                os.remove(img_path)
-                
-            current_measure = next_measure
+        for chord_elements, num_measures, melody_elements in pages:
+            shift = current_measure * BEATS_PER_MEASURE
+            for offset, el in chord_elements:
+                chord_part.insert(offset + shift, el)
+            for offset, el in melody_elements:
+                melody_part.insert(offset + shift, el)
+            current_measure += num_measures
             
         combined_score.insert(0, melody_part)
         combined_score.insert(0, chord_part)
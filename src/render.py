@@ -61,10 +61,19 @@ def annotate_score(score, key, roman_numerals=None, local_keys=None):
     """
     Annotates the score with guide tones, non-diatonic highlights, Roman Numerals,
     actual Chord Symbols (e.g., Gmin7), and sequence brackets (e.g., ii-V-I).
+    `score` may be a ChordTimeline, which is materialized into a new Score, and
+    `roman_numerals` may be an analyzed ChordTimeline instead of a list of RomanNumerals.
     Modifies the score in place.
     """
-    from src.analyze import get_guide_tones, is_diatonic, guess_jazz_chord, identify_ii_v_i
-    from music21 import harmony, spanner, expressions
+    from src.analyze import get_guide_tones, guess_jazz_chord, identify_ii_v_i, non_diatonic_masks, non_diatonic_pitch_classes
+    from src.timeline import ChordTimeline
+    from src.keymap import KeyMap
+    from music21 import harmony, spanner, expressions, stream
+
+    if isinstance(score, ChordTimeline):
+        timeline_score = stream.Score()
+        timeline_score.insert(0, score.to_part())
+        score = timeline_score
     
     # Extract chords in the same order they would be analyzed
     chords = list(score.flatten().getElementsByClass(chord.Chord))
@@ -98,12 +107,14 @@ def annotate_score(score, key, roman_numerals=None, local_keys=None):
                 part = score.parts[0] if score.parts else score
                 part.insert(ii_chord.offset, te)
     
+    # Flag non-diatonic pitches for all chords at once
+    non_diatonic = non_diatonic_masks(chords, key)
+
+    # Determine the local key for every chord in one lookup
+    chord_keys = KeyMap.coerce(local_keys).keys_at([float(c.offset) for c in chords]) if local_keys else [key] * len(chords)
+
     for i, el in enumerate(chords):
-        # Determine the local key for this chord
-        current_key = key
-        if local_keys:
-            window_start = (el.offset // 16.0) * 16.0
-            current_key = local_keys.get(window_start, key)
+        current_key = chord_keys[i]
             
         # 1. Add Chord Symbols (Lead Sheet style) using the intelligent guesser
         try:
@@ -132,19 +143,16 @@ def annotate_score(score, key, roman_numerals=None, local_keys=None):
             
         if roman_numerals and i < len(roman_numerals):
             # Add the Roman Numeral figure
-            lyrics.append(roman_numerals[i].figure)
+            if isinstance(roman_numerals, ChordTimeline):
+                lyrics.append(roman_numerals.roman_figure(i))
+            else:
+                lyrics.append(roman_numerals[i].figure)
         
         if lyrics:
             el.lyric = "/".join(lyrics)
         
         # Color non-diatonic notes within the chord if possible
-        has_non_diatonic = False
-        for p in el.pitches:
-            if not is_diatonic(p, key):
-                has_non_diatonic = True
-                break
-        
-        if has_non_diatonic:
+        if non_diatonic[i]:
             el.style.color = 'red'
             if el.lyric:
                 el.lyric += " (non-dia)"
@@ -152,8 +160,10 @@ def annotate_score(score, key, roman_numerals=None, local_keys=None):
                 el.lyric = "non-dia"
     
     # Also color individual notes if they exist (not inside a chord)
-    for el in score.flatten().getElementsByClass(note.Note):
-        if not is_diatonic(el.pitch, key):
+    notes = list(score.flatten().getElementsByClass(note.Note))
+    flags = non_diatonic_pitch_classes([n.pitch.pitchClass for n in notes], key)
+    for el, flagged in zip(notes, flags):
+        if flagged:
             el.style.color = 'red'
             el.lyric = "non-dia"
             
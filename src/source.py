@@ -1,12 +1,14 @@
 import os
 import tempfile
 import mido
-from music21 import converter, instrument
+import numpy as np
+from music21 import converter, instrument, note, stream
 
-def load_midi(file_path):
+def load_midi(file_path, raise_errors=False):
     """
     Loads a MIDI file and returns a music21 stream object.
     Filters out percussion (channel 10) to avoid analysis errors.
+    Unreadable files print an error and return None, or raise with raise_errors.
     """
     try:
         # 1. Pre-filter percussion using mido
@@ -60,5 +62,202 @@ def load_midi(file_path):
             
         return score
     except Exception as e:
+        if raise_errors:
+            raise
+        print(f"Error loading MIDI file {file_path}: {e}")
+        return None
+
+# Bump whenever load_midi_notes output changes, to invalidate cached note tables
+LOADER_VERSION = 1
+
+# Name the General MIDI programs music21 maps to rhythm-section instruments,
+# so the fast loader keeps exactly the tracks load_midi would keep.
+_RHYTHM_SECTION_PROGRAMS = None
+
+def _rhythm_section_programs():
+    global _RHYTHM_SECTION_PROGRAMS
+    if _RHYTHM_SECTION_PROGRAMS is None:
+        allowed_classes = (
+            instrument.KeyboardInstrument,
+            instrument.ElectricBass,
+            instrument.AcousticBass,
+            instrument.FretlessBass,
+            instrument.Contrabass,
+            instrument.Guitar,
+        )
+        programs = np.zeros(128, dtype=bool)
+        for program in range(128):
+            try:
+                inst = instrument.instrumentFromMidiProgram(program)
+            except Exception:
+                continue
+            programs[program] = isinstance(inst, allowed_classes)
+        _RHYTHM_SECTION_PROGRAMS = programs
+    return _RHYTHM_SECTION_PROGRAMS
+
+def _snap_quarter_lengths(values, divisors=(4, 3), zero_allowed=True):
+    """
+    Snaps quarter lengths to the nearest multiple of 1/d for the given divisors,
+    mirroring the grid music21 quantizes parsed MIDI onto.
+    """
+    best = np.round(values * divisors[0]) / divisors[0]
+    for d in divisors[1:]:
+        candidate = np.round(values * d) / d
+        closer = np.abs(candidate - values) < np.abs(best - values)
+        best = np.where(closer, candidate, best)
+    if not zero_allowed:
+        best = np.maximum(best, 1.0 / max(divisors))
+    return best
+
+class NoteTable:
+    """
+    Columnar note data for a MIDI file: one row per sounding note.
+    Onsets and durations are in quarter lengths, like music21 offsets.
+    `length` overrides the table's highest time (see from_score).
+    The equivalent music21 Score is built lazily on first access of `score`.
+    """
+    __slots__ = ('onset', 'duration', 'pitch', 'velocity', 'channel', 'program', 'length', 'source_path', '_score')
+
+    def __init__(self, onset, duration, pitch, velocity, channel, program, length=None, source_path=None):
+        self.onset = onset
+        self.duration = duration
+        self.pitch = pitch
+        self.velocity = velocity
+        self.channel = channel
+        self.program = program
+        self.length = float(length) if length is not None else None
+        self.source_path = source_path
+        self._score = None
+
+    @classmethod
+    def from_score(cls, score, source_path=None):
+        """
+        Flattens a load_midi score into a table with one row per sounding
+        pitch, in the score's flattened order, keeping the score's highest
+        time (music21 pads the last measure). Quantizing the table gives the
+        same buckets as quantizing the score. Channels are not kept (-1).
+        """
+        programs = {}
+        for part in score.parts:
+            inst = part.getInstrument()
+            program = inst.midiProgram if inst is not None and inst.midiProgram is not None else 0
+            for el in part.recurse().notes:
+                programs[id(el)] = program
+
+        rows = []
+        for el in score.flatten().notes:
+            velocity = el.volume.velocity or 0
+            rows.extend((float(el.offset), float(el.duration.quarterLength), p.midi, velocity, programs.get(id(el), 0))
+                        for p in el.pitches)
+        data = np.array(rows, dtype=float).reshape(-1, 5)
+        return cls(
+            onset=data[:, 0],
+            duration=data[:, 1],
+            pitch=data[:, 2].astype(np.uint8),
+            velocity=data[:, 3].astype(np.uint8),
+            channel=np.full(len(data), -1, dtype=np.int8),
+            program=data[:, 4].astype(np.uint8),
+            length=float(score.highestTime),
+            source_path=source_path,
+        )
+
+    def __len__(self):
+        return len(self.onset)
+
+    @property
+    def end(self):
+        return self.onset + self.duration
+
+    @property
+    def highest_time(self):
+        if self.length is not None:
+            return self.length
+        return float(self.end.max()) if len(self) else 0.0
+
+    @property
+    def score(self):
+        if self._score is None:
+            self._score = self.to_score()
+        return self._score
+
+    def to_score(self):
+        """
+        Builds a music21 Score with one Part per MIDI program.
+        """
+        score = stream.Score()
+        for program in np.unique(self.program):
+            part = stream.Part()
+            part.insert(0, instrument.instrumentFromMidiProgram(int(program)))
+            for i in np.flatnonzero(self.program == program):
+                n = note.Note(int(self.pitch[i]))
+                n.duration.quarterLength = float(self.duration[i])
+                n.volume.velocity = int(self.velocity[i])
+                part.insert(float(self.onset[i]), n)
+            score.insert(0, part)
+        return score
+
+def load_midi_notes(file_path, quantize=True, raise_errors=False):
+    """
+    Fast-path loader: reads a MIDI file once with mido and returns a NoteTable.
+    Drops percussion (channel 10) and, where any are present, keeps only
+    rhythm-section programs (keyboards, guitars, basses), like load_midi.
+    When quantize is True, onsets and durations are snapped to the same
+    1/4 and 1/3 beat grid music21 applies when parsing MIDI.
+    Unreadable files print an error and return None, or raise with raise_errors.
+    """
+    try:
+        mid = mido.MidiFile(file_path)
+        ticks_per_beat = float(mid.ticks_per_beat)
+        rows = []
+
+        for track in mid.tracks:
+            programs = [0] * 16
+            sounding = {}
+            tick = 0
+            for msg in track:
+                tick += msg.time
+                if not hasattr(msg, 'channel') or msg.channel == 9:
+                    continue
+                if msg.type == 'program_change':
+                    programs[msg.channel] = msg.program
+                elif msg.type == 'note_on' and msg.velocity > 0:
+                    sounding.setdefault((msg.channel, msg.note), []).append((tick, msg.velocity, programs[msg.channel]))
+                elif msg.type in ('note_off', 'note_on'):
+                    started = sounding.get((msg.channel, msg.note))
+                    if started:
+                        start, velocity, program = started.pop(0)
+                        rows.append((start, tick - start, msg.note, velocity, msg.channel, program))
+            # Close any notes left hanging at the end of the track
+            for (channel, pitch), started in sounding.items():
+                for start, velocity, program in started:
+                    rows.append((start, tick - start, pitch, velocity, channel, program))
+
+        data = np.array(rows, dtype=np.int64).reshape(-1, 6)
+        data = data[np.lexsort((data[:, 2], data[:, 0]))]
+
+        program = data[:, 5].astype(np.uint8)
+        keep = _rhythm_section_programs()[program]
+        if keep.any():
+            data = data[keep]
+            program = program[keep]
+
+        onset = data[:, 0] / ticks_per_beat
+        duration = data[:, 1] / ticks_per_beat
+        if quantize:
+            onset = _snap_quarter_lengths(onset)
+            duration = _snap_quarter_lengths(duration, zero_allowed=False)
+
+        return NoteTable(
+            onset=onset,
+            duration=duration,
+            pitch=data[:, 2].astype(np.uint8),
+            velocity=data[:, 3].astype(np.uint8),
+            channel=data[:, 4].astype(np.uint8),
+            program=program,
+            source_path=file_path,
+        )
+    except Exception as e:
+        if raise_errors:
+            raise
         print(f"Error loading MIDI file {file_path}: {e}")
         return None
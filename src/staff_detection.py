@@ -0,0 +1,135 @@
+import cv2
+import numpy as np
+
+# Resolution pages are rendered at, and the (lower) resolution systems and barlines are detected at
+PAGE_DPI = 300
+DETECTION_DPI = 100
+
+def _px(value, scale):
+    """Scales a pixel size tuned for 300 DPI pages, keeping it at least 1."""
+    return max(1, int(round(value * scale)))
+
+def _downsample(gray, scale):
+    if scale >= 1.0:
+        return gray
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+def _fit_min(xs, ys, tolerance=2):
+    """
+    Fits a straight line through (xs, ys), refitting once without the points
+    more than tolerance pixels off it, and returns its lowest y over the xs' range.
+    """
+    slope, intercept = np.polyfit(xs, ys, 1)
+    inliers = np.abs(ys - (slope * xs + intercept)) <= tolerance
+    if inliers.sum() >= 2:
+        slope, intercept = np.polyfit(xs[inliers], ys[inliers], 1)
+    return int(round(min(slope * xs[0], slope * xs[-1]) + intercept))
+
+def _find_systems(detect_horizontal, max_gap):
+    """
+    Joins the pieces of each staff line (split by noteheads, or into steps on
+    a skewed scan) and closes lines less than max_gap apart into one band
+    per system; bands wider than a quarter of the page are systems. Straight
+    lines fitted along each band's top and bottom edges (ignoring whatever
+    else sticks out of the staff) give its top and bottom y at their highest
+    point. Returns [(top line y, bottom line y), ...] from the top of the page down.
+    """
+    width = detect_horizontal.shape[1]
+    band_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (width // 40, max_gap))
+    bands = cv2.morphologyEx(detect_horizontal, cv2.MORPH_CLOSE, band_kernel)
+    _, labels, stats, _ = cv2.connectedComponentsWithStats(bands, connectivity=8)
+    systems = []
+    for i in np.argsort(stats[1:, cv2.CC_STAT_TOP]) + 1:
+        x, y, w, h = stats[i, :4]
+        if w <= width // 4:
+            continue
+        band = labels[y:y + h, x:x + w] == i
+        columns = np.flatnonzero(band.any(axis=0))
+        top_edge = band[:, columns].argmax(axis=0)
+        bottom_edge = h - 1 - band[::-1, columns].argmax(axis=0)
+        systems.append((y + _fit_min(columns, top_edge), y + _fit_min(columns, bottom_edge)))
+    return systems
+
+def _find_barlines(detect_vertical, noteheads, systems, max_height, margin, min_coverage=0.8):
+    """
+    Takes the connected components of the vertical-line mask as candidate
+    lines. A component is a barline of the system whose staff (+/- margin)
+    contains its middle when its bounding box spans at least min_coverage
+    of the staff height, is shorter than max_height (page borders, brackets)
+    and has no filled notehead within margin of it. A stem plus its head is
+    nearly a staff tall at detection resolution, so the head tells them apart;
+    bounding boxes keep their height on skewed scans. Barlines closer than
+    margin are merged.
+    Returns {system index: sorted barline x positions}.
+    """
+    system_bars = {i: [] for i in range(len(systems))}
+    if not systems:
+        return system_bars
+    tops = np.array([top for top, _ in systems])
+    bottoms = np.array([bottom for _, bottom in systems])
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(detect_vertical, connectivity=8)
+    xs, ys = stats[1:, cv2.CC_STAT_LEFT], stats[1:, cv2.CC_STAT_TOP]
+    widths, heights = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT]
+    middles = ys + heights / 2
+    system_idx = np.searchsorted(tops - margin, middles, side='right') - 1
+    band = np.maximum(system_idx, 0)
+
+    # Notehead pixels in each component's box grown by margin, from an integral image
+    height, width = noteheads.shape
+    heads = cv2.integral((noteheads > 0).astype(np.uint8))
+    x0, x1 = np.clip(xs - margin, 0, width), np.clip(xs + widths + margin, 0, width)
+    y0, y1 = np.clip(ys - margin, 0, height), np.clip(ys + heights + margin, 0, height)
+    head_pixels = heads[y1, x1] - heads[y0, x1] - heads[y1, x0] + heads[y0, x0]
+
+    barline = ((system_idx >= 0) & (middles <= bottoms[band] + margin) & (heights < max_height)
+               & (heights >= min_coverage * (bottoms - tops)[band]) & (head_pixels == 0))
+    if not barline.any():
+        return system_bars
+
+    # Barlines in system-major then x order; drop those within margin of the previous one
+    order = np.lexsort((xs[barline], system_idx[barline]))
+    bar_systems, bar_xs = system_idx[barline][order], xs[barline][order]
+    new_system = np.diff(bar_systems, prepend=-1) != 0
+    keep = new_system | (np.diff(bar_xs, prepend=-margin) >= margin)
+    for i, x in zip(bar_systems[keep].tolist(), bar_xs[keep].tolist()):
+        system_bars[i].append(x)
+    return system_bars
+
+def detect_staff_layout(gray, page_dpi=PAGE_DPI, detection_dpi=DETECTION_DPI):
+    """
+    Finds the staff systems and barlines of a grayscale page image.
+    Detection runs on a copy downsampled to detection_dpi (None for full
+    resolution) and coordinates are mapped back to the page's pixels.
+    Returns (systems, system_bars): a list of (top y, bottom y) per system
+    and {system index: sorted barline x positions}.
+    """
+    scale = min(1.0, detection_dpi / page_dpi) if detection_dpi else 1.0
+    small = _downsample(gray, scale)
+    block_size = _px(11, scale) | 1
+    thresh = cv2.adaptiveThreshold(small, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, max(block_size, 3), 2)
+
+    width = small.shape[1]
+    # A single opening pass: a second one would erase the steps of a skewed staff line
+    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (width // 40, 1))
+    detect_horizontal = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, horizontal_kernel)
+    # Open the max of each pair of adjacent columns, so a barline that steps sideways
+    # partway down a skewed scan isn't cut short by a one-column gap
+    paired = cv2.dilate(thresh, cv2.getStructuringElement(cv2.MORPH_RECT, (2, 1)))
+    vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, _px(40, scale)))
+    detect_vertical = cv2.morphologyEx(paired, cv2.MORPH_OPEN, vertical_kernel, iterations=2)
+
+    # Filled noteheads: solid blobs wider and taller than any line or text stroke
+    # (but narrower than a thick final barline). The adaptive threshold hollows
+    # them out, so they come from a global one
+    _, ink = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    head_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (_px(15, scale), _px(9, scale)))
+    noteheads = cv2.morphologyEx(ink, cv2.MORPH_OPEN, head_kernel)
+
+    systems = _find_systems(detect_horizontal, _px(60, scale))
+    system_bars = _find_barlines(detect_vertical, noteheads, systems, _px(300, scale), _px(20, scale))
+
+    # Map coordinates back to full resolution
+    systems = [(int(round(top / scale)), int(round(bottom / scale))) for top, bottom in systems]
+    system_bars = {i: sorted(int(round(x / scale)) for x in bars) for i, bars in system_bars.items()}
+    return systems, system_bars
@@ -0,0 +1,176 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import sys
+import time
+from src.accuracy_benchmark import DEFAULT_OPENBOOK_DIR, _git_commit, load_ground_truth, pair_corpus, read_manifest
+from src.batch import run_parallel
+from src.parse import DEFAULT_SHIFT, DEFAULT_START_OFFSET
+
+PARAMETERS = ('beats_per_chord', 'shift', 'start_offset', 'window_size')
+METRICS = ('symbol_accuracy', 'root_accuracy', 'quality_accuracy')
+
+def expand_grid(grid):
+    """
+    Expands {parameter: [values]} into a list of configuration dictionaries
+    (the cartesian product), in a stable order.
+    """
+    return [dict(zip(PARAMETERS, values)) for values in itertools.product(*(grid[p] for p in PARAMETERS))]
+
+def config_label(config):
+    return ' '.join(f"{p}={config[p]:g}" for p in PARAMETERS)
+
+def _sweep_tune(item, configs, cache_dir=None, loader='mido'):
+    """
+    Scores one (midi path, ground truth symbols) item under every
+    configuration. The tune is loaded once, each (shift, start offset) group
+    is quantized at all of its beats_per_chord values in a single pass, and
+    each quantization is reused for every key window size. Returns {'results': [[config, counts], ...], 'timings': {...}}.
+    """
+    from src.accuracy_tester import analyze_symbols, score_symbols
+    from src.cache import DiskCache, load_notes
+    from src.parse import quantize_harmony_multi
+
+    midi_path, truth = item
+    if not truth:
+        raise ValueError("no ground truth chords found")
+    timings = {'load': 0.0, 'quantize': 0.0, 'analyze': 0.0, 'symbols': 0.0, 'align': 0.0}
+
+    start = time.perf_counter()
+    notes = load_notes(midi_path, DiskCache(cache_dir) if cache_dir else None, loader=loader, raise_errors=True)
+    timings['load'] += time.perf_counter() - start
+    if notes is None or len(notes) == 0:
+        raise ValueError("no pitched notes found")
+
+    groups = {}
+    for config in configs:
+        groups.setdefault((config['shift'], config['start_offset']), []).append(config)
+
+    results = []
+    for (shift, start_offset), group in groups.items():
+        start = time.perf_counter()
+        resolutions = sorted(set(c['beats_per_chord'] for c in group))
+        timelines = quantize_harmony_multi(notes, resolutions, as_timeline=True, shift=shift, start_offset=start_offset)
+        timings['quantize'] += time.perf_counter() - start
+
+        for config in group:
+            # analyze_progression edits chords in place, so every run gets a fresh Part
+            stage_timings = {}
+            analyzed, _ = analyze_symbols(timelines[config['beats_per_chord']].to_part(), config['window_size'], stage_timings)
+            start = time.perf_counter()
+            counts = score_symbols(truth, analyzed)
+            stage_timings['align'] = time.perf_counter() - start
+            for stage, seconds in stage_timings.items():
+                timings[stage] += seconds
+            results.append([config, counts])
+    return {'results': results, 'timings': timings}
+
+def rank_configs(records, configs, rank_by='symbol_accuracy'):
+    """
+    Aggregates per-tune counts into micro-averaged accuracies per
+    configuration and sorts configurations best first.
+    """
+    totals = {config_label(c): {'config': c, 'tunes': 0, 'compared': 0, 'symbol': 0, 'root': 0, 'quality': 0}
+              for c in configs}
+    for record in records:
+        if record['status'] != 'ok':
+            continue
+        for config, counts in record['results']:
+            entry = totals[config_label(config)]
+            entry['tunes'] += 1
+            for name in ('compared', 'symbol', 'root', 'quality'):
+                entry[name] += counts[name]
+
+    ranking = []
+    for entry in totals.values():
+        compared = entry['compared']
+        for name in ('symbol', 'root', 'quality'):
+            entry[f"{name}_accuracy"] = entry[name] / compared if compared else 0.0
+        ranking.append(entry)
+    return sorted(ranking, key=lambda entry: entry[rank_by], reverse=True)
+
+def run_sweep(pairs, grid, output_path, workers=None, chunk_size=1, timeout=3600.0,
+              cache_dir=None, store_path=None, rank_by='symbol_accuracy', loader='mido'):
+    """
+    Scores every configuration of the parameter grid on every (midi, mako)
+    pair, one tune per task across a process pool, and writes a JSON report
+    ranking the configurations by `rank_by`. Returns the report.
+    """
+    from src.ground_truth import parse_lilypond_chords
+
+    configs = expand_grid(grid)
+    start = time.perf_counter()
+    if store_path:
+        ground_truth = load_ground_truth(pairs, store_path)
+    else:
+        ground_truth = {midi: parse_lilypond_chords(mako) for midi, mako in pairs}
+
+    records = []
+    items = [(midi, ground_truth[midi]) for midi, _ in pairs]
+    for record in run_parallel(_sweep_tune, items, workers=workers, chunk_size=chunk_size, timeout=timeout,
+                               configs=configs, cache_dir=cache_dir, loader=loader):
+        records.append(record)
+        status = f"{record['seconds']:.1f}s" if record['status'] == 'ok' else f"{record['status']} ({record.get('error')})"
+        print(f"[{len(records)}/{len(pairs)}] {os.path.basename(record['file'])}: {status}")
+    wall_seconds = time.perf_counter() - start
+
+    timings = {}
+    for record in records:
+        for stage, seconds in record.get('timings', {}).items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    report = {
+        'commit': _git_commit(),
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'grid': grid,
+        'rank_by': rank_by,
+        'loader': loader,
+        'files': len(records),
+        'failed': [{'file': r['file'], 'status': r['status'], 'error': r.get('error')} for r in records if r['status'] != 'ok'],
+        'wall_seconds': wall_seconds,
+        'timings': timings,
+        'ranking': rank_configs(records, configs, rank_by),
+    }
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+    return report
+
+if __name__ == '__main__':
+    from src.cache import DEFAULT_CACHE_DIR, LOADERS
+
+    parser = argparse.ArgumentParser(description="Sweep quantization and key-window settings against the openbook ground truth.")
+    parser.add_argument('source', help="directory of MIDI files, or a manifest of '<midi> <mako>' lines")
+    parser.add_argument('--openbook', default=DEFAULT_OPENBOOK_DIR, help="directory of .ly.mako files")
+    parser.add_argument('--beats-per-chord', type=float, nargs='+', default=[1.0, 2.0, 4.0])
+    parser.add_argument('--shift', type=float, nargs='+', default=[DEFAULT_SHIFT])
+    parser.add_argument('--start-offset', type=float, nargs='+', default=[DEFAULT_START_OFFSET])
+    parser.add_argument('--window-size', type=float, nargs='+', default=[8.0, 16.0, 32.0])
+    parser.add_argument('--rank-by', choices=METRICS, default='symbol_accuracy')
+    parser.add_argument('--loader', choices=LOADERS, default='mido', help="note loader (music21 matches accuracy_tester)")
+    parser.add_argument('-o', '--output', default='sweep_report.json')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--timeout', type=float, default=3600.0, help="per-tune timeout in seconds (whole grid)")
+    parser.add_argument('--store', help="compiled ground truth store (default: ground_truth.db in the cache directory)")
+    parser.add_argument('--no-cache', action='store_true', help="disable the disk cache and the ground truth store")
+    parser.add_argument('--top', type=int, default=10, help="number of configurations to print")
+    args = parser.parse_args()
+
+    pairs = pair_corpus(args.source, args.openbook) if os.path.isdir(args.source) else read_manifest(args.source)
+    if not pairs:
+        print(f"No MIDI files with matching ground truth found in {args.source}")
+        sys.exit(1)
+
+    grid = {'beats_per_chord': args.beats_per_chord, 'shift': args.shift,
+            'start_offset': args.start_offset, 'window_size': args.window_size}
+    report = run_sweep(pairs, grid, args.output, workers=args.workers, timeout=args.timeout,
+                       cache_dir=None if args.no_cache else DEFAULT_CACHE_DIR,
+                       store_path=None if args.no_cache else args.store or os.path.join(DEFAULT_CACHE_DIR, 'ground_truth.db'),
+                       rank_by=args.rank_by, loader=args.loader)
+
+    print(f"\nSwept {len(report['ranking'])} configurations over {report['files']} tunes in {report['wall_seconds']:.1f}s")
+    for entry in report['ranking'][:args.top]:
+        print(f"{entry['symbol_accuracy']:6.1%} symbol  {entry['root_accuracy']:6.1%} root  "
+              f"{entry['quality_accuracy']:6.1%} quality  {config_label(entry['config'])}")
+    print(f"Report written to {args.output}")
@@ -0,0 +1,175 @@
+import numpy as np
+from music21 import chord, note, stream
+from src.pcset import REDUCED_MASKS, chord_mask, mask_to_pitch_classes, tertian_chord, tertian_symbol_figure
+
+# Scale degree of a root a given number of semitones above the tonic,
+# following music21's Roman numeral spelling (bII -> 2, #IV -> 4, bVII -> 7)
+_SEMITONE_DEGREES = np.array([1, 2, 2, 3, 3, 4, 4, 5, 6, 6, 7, 7], dtype=np.int8)
+_DIATONIC_SEMITONES = {
+    'major': [0, 2, 4, 5, 7, 9, 11],
+    'minor': [0, 2, 3, 5, 7, 8, 10],
+}
+_NUMERALS = ['I', 'II', 'III', 'IV', 'V', 'VI', 'VII']
+
+class ChordTimeline:
+    """
+    Struct-of-arrays representation of a chord progression: one row per chord,
+    one NumPy column per attribute, about 25 bytes per chord.
+
+    - offsets, durations: position and length in quarter lengths
+    - root_pc, bass_pc: pitch classes (0-11)
+    - pc_mask: 12-bit pitch-class set (see src.pcset)
+    - key_index: local key, 0-11 major / 12-23 minor by tonic pitch class, -1 if unknown
+    - scale_degree: root's scale degree in the local key (1-7), 0 if unknown
+    - symbol_id: index into `symbols` of the chord symbol figure, -1 if unknown
+    """
+    __slots__ = ('offsets', 'durations', 'root_pc', 'pc_mask', 'bass_pc',
+                 'key_index', 'scale_degree', 'symbol_id', 'symbols')
+
+    def __init__(self, offsets, durations, root_pc, pc_mask, bass_pc=None, symbols=None, symbol_id=None):
+        n = len(offsets)
+        self.offsets = np.asarray(offsets, dtype=np.float64)
+        self.durations = np.asarray(durations, dtype=np.float64)
+        self.root_pc = np.asarray(root_pc, dtype=np.int8)
+        self.pc_mask = np.asarray(pc_mask, dtype=np.uint16)
+        self.bass_pc = np.asarray(bass_pc if bass_pc is not None else root_pc, dtype=np.int8)
+        self.key_index = np.full(n, -1, dtype=np.int8)
+        self.scale_degree = np.zeros(n, dtype=np.int8)
+        self.symbols = list(symbols) if symbols is not None else []
+        self.symbol_id = np.asarray(symbol_id if symbol_id is not None else np.full(n, -1), dtype=np.int16)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def highest_time(self):
+        return float((self.offsets + self.durations).max()) if len(self) else 0.0
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.__slots__ if name != 'symbols')
+
+    def symbol(self, i):
+        sid = self.symbol_id[i]
+        return self.symbols[sid] if sid >= 0 else None
+
+    def _intern(self, figure):
+        """Returns the symbol_id of a figure, adding it to `symbols` if new (-1 for None)."""
+        if figure is None:
+            return -1
+        if figure not in self.symbols:
+            self.symbols.append(figure)
+        return self.symbols.index(figure)
+
+    @classmethod
+    def from_figures(cls, offsets, durations, root_pc, pc_mask, figures, bass_pc=None):
+        """
+        Builds a timeline, interning the per-chord symbol figures (None for unknown).
+        """
+        symbols = []
+        ids = {}
+        symbol_id = []
+        for figure in figures:
+            if figure is None:
+                symbol_id.append(-1)
+                continue
+            if figure not in ids:
+                ids[figure] = len(symbols)
+                symbols.append(figure)
+            symbol_id.append(ids[figure])
+        return cls(offsets, durations, root_pc, pc_mask, bass_pc=bass_pc, symbols=symbols, symbol_id=symbol_id)
+
+    @classmethod
+    def from_chords(cls, chords):
+        """
+        Builds a timeline from music21 chords (e.g. a quantized Part's chords).
+        """
+        offsets, durations, roots, masks, basses, figures = [], [], [], [], [], []
+        for c in chords:
+            offsets.append(float(c.offset))
+            durations.append(float(c.duration.quarterLength))
+            roots.append(c.root().pitchClass)
+            basses.append(c.bass().pitchClass)
+            masks.append(chord_mask(c))
+            figures.append(getattr(c, 'chord_symbol_figure', None))
+        return cls.from_figures(offsets, durations, roots, masks, figures, bass_pc=basses)
+
+    def chord_at(self, i):
+        """
+        Materializes row i as a music21 Chord (root or bass in octave 3, the rest in octave 4).
+        """
+        root, bass, mask = int(self.root_pc[i]), int(self.bass_pc[i]), int(self.pc_mask[i])
+        if bass == root and REDUCED_MASKS[root, mask] == mask:
+            c = tertian_chord(root, mask)
+        else:
+            pitches = []
+            for pc in mask_to_pitch_classes(mask):
+                p = note.Pitch(pc)
+                p.octave = 3 if pc == bass else 4
+                pitches.append(p)
+            c = chord.Chord(pitches)
+            c.root(note.Pitch(root))
+        c.duration.quarterLength = float(self.durations[i])
+        figure = self.symbol(i)
+        if figure:
+            c.chord_symbol_figure = figure
+        return c
+
+    def to_part(self):
+        """
+        Materializes the timeline as a music21 Part of Chords.
+        """
+        part = stream.Part()
+        for i in range(len(self)):
+            part.insert(float(self.offsets[i]), self.chord_at(i))
+        return part
+
+    def set_keys(self, key_index):
+        """
+        Stores the local key of every chord and derives the roots' scale degrees.
+        """
+        self.key_index = np.asarray(key_index, dtype=np.int8)
+        tonics = self.key_index % 12
+        degrees = _SEMITONE_DEGREES[(self.root_pc - tonics) % 12]
+        self.scale_degree = np.where(self.key_index >= 0, degrees, 0).astype(np.int8)
+
+    def add_root(self, i, root_pc):
+        """
+        Adds an implied root (in the bass) to chord i, as contextualize_chords does,
+        and renames it with the symbol figure of its new tertian reduction.
+        """
+        self.root_pc[i] = root_pc
+        self.bass_pc[i] = root_pc
+        self.pc_mask[i] |= 1 << int(root_pc)
+        self.symbol_id[i] = self._intern(tertian_symbol_figure(root_pc, int(self.pc_mask[i])))
+        if self.key_index[i] >= 0:
+            self.scale_degree[i] = _SEMITONE_DEGREES[(root_pc - self.key_index[i] % 12) % 12]
+
+    def roman_figure(self, i):
+        """
+        Returns a basic Roman numeral figure for chord i, e.g. 'ii7', 'V7', 'bVII', 'viiø7'.
+        """
+        if self.key_index[i] < 0:
+            return '?'
+        tonic = self.key_index[i] % 12
+        mode = 'minor' if self.key_index[i] >= 12 else 'major'
+        root = int(self.root_pc[i])
+        interval = (root - tonic) % 12
+        degree = int(self.scale_degree[i])
+        diatonic = _DIATONIC_SEMITONES[mode][degree - 1]
+        prefix = '' if interval == diatonic else ('b' if interval < diatonic else '#')
+
+        mask = int(self.pc_mask[i])
+        has = lambda semitones: bool(mask & (1 << ((root + semitones) % 12)))
+        numeral = _NUMERALS[degree - 1]
+        if has(3) and not has(4):
+            numeral = numeral.lower()
+        if has(3) and has(6) and not has(7):
+            suffix = 'o7' if has(9) and not has(10) else ('ø7' if has(10) else 'o')
+        elif has(11):
+            suffix = 'maj7'
+        elif has(10):
+            suffix = '7'
+        else:
+            suffix = ''
+        return prefix + numeral + suffix
@@ -1,6 +1,6 @@
-from src.source import load_midi
+from src.cache import DiskCache, load_notes, quantize_timeline
 from src.render import render_to_musicxml, annotate_score
-from src.parse import quantize_harmony, get_chord_names
+from src.parse import get_chord_names
 from src.analyze import detect_key, detect_local_keys, analyze_progression, identify_ii_v_i, identify_tritone_subs
 from music21 import instrument, stream
 import os
@@ -8,27 +8,31 @@ import sys
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python test_real_midi.py <path_to_midi>")
+        print("Usage: python test_real_midi.py <path_to_midi> [--no-cache]")
         return
 
     input_midi = sys.argv[1]
     base_name = os.path.splitext(os.path.basename(input_midi))[0]
     output_xml = f"output/{base_name}_quantized.musicxml"
     
+    # Cache the loaded notes and quantized chords unless --no-cache is given.
+    # The music21 loader keeps the output identical to parsing with load_midi.
+    cache = None if '--no-cache' in sys.argv[2:] else DiskCache()
+    
     print(f"Loading {input_midi}...")
-    score = load_midi(input_midi)
+    notes = load_notes(input_midi, cache, loader='music21')
     
-    if score:
+    if notes is not None:
         print("Successfully loaded MIDI.")
-        print(f"Pitched tracks/parts: {len(score.parts)}")
+        print(f"Pitched tracks/parts: {len(set(notes.program.tolist()))}")
 
-        if len(score.parts) == 0:
+        if len(notes) == 0:
             print("No pitched tracks found. Exiting.")
             return
 
         # Quantize Harmony FIRST so we have clean windows for key detection
         print("Quantizing harmony into 4-beat buckets...")
-        quantized_part = quantize_harmony(score, beats_per_chord=4.0)
+        quantized_part = quantize_timeline(input_midi, beats_per_chord=4.0, cache=cache, notes=notes, loader='music21').to_part()
         
         # Analyze local keys
         try:
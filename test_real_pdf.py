@@ -1,3 +1,4 @@
+from src.cache import DiskCache
 from src.pdf_source import load_pdf
 from src.render import render_to_musicxml, annotate_score, render_to_pdf
 from src.analyze import detect_key, analyze_progression, identify_ii_v_i
@@ -7,15 +8,20 @@ import sys
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python test_real_pdf.py <path_to_pdf>")
+        print("Usage: python test_real_pdf.py <path_to_pdf> [workers] [--no-cache]")
         return
         
     input_pdf = sys.argv[1]
+    args = [a for a in sys.argv[2:] if a != '--no-cache']
+    workers = int(args[0]) if args else 1
+
+    # Cache OCR/AI results per chord strip unless --no-cache is given
+    cache = None if '--no-cache' in sys.argv[2:] else DiskCache()
     base_name = os.path.splitext(os.path.basename(input_pdf))[0]
     output_pdf = f"output/{base_name}_annotated.pdf"
     
     print(f"Loading and transcribing {input_pdf} (chords only)...")
-    score = load_pdf(input_pdf, include_melody=False)
+    score = load_pdf(input_pdf, include_melody=False, workers=workers, cache=cache)
     
     if score:
         print("Successfully transcribed PDF.")
@@ -0,0 +1,301 @@
+from src.source import load_midi, NoteTable
+from src.parse import quantize_harmony, quantize_harmony_multi
+from src.pcset import chord_mask
+from music21 import chord, harmony, note
+from mido import Message, MidiFile, MidiTrack
+from fractions import Fraction
+import numpy as np
+import os
+import sys
+import tempfile
+
+RESOLUTIONS = (1.0, 2.0, 4.0)
+# Generated tables are also checked at off-grid sizes (their common grid is half a beat)
+TABLE_SEEDS = (0, 1, 2, 3, 4, 5, 6, 7)
+TABLE_RESOLUTIONS = (1.0, 1.5, 2.0, 3.0, 4.0)
+
+def _track(program, channel, notes):
+    """Builds a track from (start tick, end tick, pitch) notes."""
+    events = []
+    for start, end, pitch in notes:
+        events.append((start, 1, Message('note_on', note=pitch, velocity=70, channel=channel)))
+        events.append((end, 0, Message('note_off', note=pitch, velocity=0, channel=channel)))
+    track = MidiTrack()
+    track.append(Message('program_change', program=program, channel=channel, time=0))
+    now = 0
+    for tick, _, msg in sorted(events, key=lambda e: (e[0], e[1])):
+        track.append(msg.copy(time=tick - now))
+        now = tick
+    return track
+
+def generate_fixture_midi(filename):
+    """
+    Writes a piano + bass ii-V-I fixture that exercises the quantizer's edge
+    cases: a pickup before beat 4, laid-back entries, chords held into the
+    next bucket and grace notes overlapping a bucket by under half a beat.
+    """
+    beat = 480
+    # Piano voicings (rootless A and B forms) for ii-V-I in a few keys
+    voicings = [
+        [65, 69, 72, 76], [65, 69, 71, 76], [64, 67, 71, 74],    # C major
+        [63, 67, 70, 74], [63, 67, 69, 74], [62, 65, 69, 72],    # Bb major
+        [60, 63, 67, 70], [61, 65, 68, 71], [60, 64, 67, 71],    # tritone sub into C
+        [66, 70, 73, 77], [65, 69, 72, 76], [64, 68, 71, 75],    # chromatic ii-V
+    ]
+    bass_roots = [38, 43, 36, 36, 41, 34, 38, 37, 36, 42, 41, 40]
+
+    piano = [(beat * 2, beat * 3, 67)]
+    for i, voicing in enumerate(voicings):
+        bar = beat * 4 * (i + 1)
+        start = bar + (beat // 4 if i % 2 else 0)
+        end = bar + beat * (5 if i % 3 == 0 else 4)
+        piano.append((start - beat // 4, start, voicing[0] - 1))
+        piano.extend((start, end, n) for n in voicing)
+
+    bass = []
+    for i, root in enumerate(bass_roots):
+        # Walking quarters: root, fifth, octave, approach note
+        for q, n in enumerate((root, root + 7, root + 12, root + 11)):
+            start = beat * (4 * (i + 1) + q)
+            bass.append((start, start + beat, n))
+
+    mid = MidiFile(ticks_per_beat=beat)
+    mid.tracks.append(_track(0, 0, piano))
+    mid.tracks.append(_track(32, 1, bass))
+    mid.save(filename)
+
+def reference_tertian_chord(raw_chord):
+    """
+    The original interval-by-interval triad/seventh reduction.
+    """
+    root_pc = raw_chord.root().pitchClass
+    pitch_classes = set(p.pitchClass for p in raw_chord.pitches)
+    intervals = [0]
+    # 3rd, then 7th, then 5th (perfect unless only a diminished or augmented one is present)
+    for choices in ((4, 3), (11, 10)):
+        present = [i for i in choices if (root_pc + i) % 12 in pitch_classes]
+        if present:
+            intervals.append(present[0])
+    if (root_pc + 6) % 12 in pitch_classes and (root_pc + 7) % 12 not in pitch_classes:
+        intervals.append(6)
+    elif (root_pc + 8) % 12 in pitch_classes and (root_pc + 7) % 12 not in pitch_classes:
+        intervals.append(8)
+    else:
+        intervals.append(7)
+
+    pitches = []
+    for i in intervals:
+        p = note.Pitch((root_pc + i) % 12)
+        p.octave = 3 if i == 0 else 4
+        pitches.append(p)
+    return chord.Chord(pitches)
+
+def reference_quantize(score, beats_per_chord, shift=0.5, start_offset=4.0):
+    """
+    The original quantize_harmony loop: scans every note for every bucket.
+    Returns one (offset, duration, pitches, root, symbol) tuple per chord.
+    """
+    all_elements = score.flatten().notes
+    buckets = []
+    current_offset = start_offset
+    while current_offset <= score.highestTime:
+        window_start = current_offset + shift
+        window_end = current_offset + beats_per_chord + shift
+
+        valid_elements = [el for el in all_elements
+                          if el.offset < window_end and el.offset + el.duration.quarterLength > window_start
+                          and min(el.offset + el.duration.quarterLength, window_end) - max(el.offset, window_start) >= 0.5]
+        window_pitches = [p for el in valid_elements for p in el.pitches]
+
+        if window_pitches:
+            earliest_offset = min(el.offset for el in valid_elements)
+            earliest_pitches = [p for el in valid_elements if el.offset <= earliest_offset + 0.5 for p in el.pitches]
+            anchor_bass = min(earliest_pitches or window_pitches, key=lambda p: p.midi)
+
+            reduced_pitches = []
+            for pc in sorted(set(p.pitchClass for p in window_pitches)):
+                p = note.Pitch(pc)
+                p.octave = 3 if pc == anchor_bass.pitchClass else 4
+                reduced_pitches.append(p)
+            raw_chord = chord.Chord(reduced_pitches)
+            raw_chord.root(anchor_bass)
+
+            clean_chord = reference_tertian_chord(raw_chord)
+            try:
+                sym = harmony.chordSymbolFigureFromChord(clean_chord)
+            except Exception:
+                sym = None
+            if sym == 'Chord Symbol Cannot Be Identified':
+                sym = None
+            buckets.append(_bucket(current_offset, beats_per_chord, clean_chord, sym))
+        current_offset += beats_per_chord
+    return buckets
+
+def generate_note_table(seed, num_notes=160, length=40):
+    """
+    Random notes on a grid of twelfths of a beat (so both eighths and triplets
+    land exactly), with the quantizer's awkward cases mixed in: notes tied
+    across bucket edges, zero-length notes, overlapping notes of the same pitch
+    and notes that overlap a bucket by exactly half a beat.
+    Returns (table, notes) where notes are exact (onset, duration, pitch) Fractions.
+    """
+    rng = np.random.default_rng(seed)
+    twelfth = Fraction(1, 12)
+    notes = []
+    while len(notes) < num_notes:
+        pitch = int(rng.integers(36, 84))
+        kind = rng.integers(6)
+        if kind == 0:
+            # Tied across a bucket edge (edges fall on x.5 with the default shift)
+            edge = Fraction(int(rng.integers(8, 2 * length)), 2)
+            split = edge - twelfth * int(rng.integers(0, 12))
+            head = twelfth * int(rng.integers(1, 24))
+            notes.append((split - head, head, pitch))
+            notes.append((split, twelfth * int(rng.integers(1, 24)), pitch))
+        elif kind == 1:
+            notes.append((twelfth * int(rng.integers(0, 12 * length)), Fraction(0), pitch))
+        elif kind == 2:
+            onset = twelfth * int(rng.integers(0, 12 * length))
+            notes.append((onset, twelfth * int(rng.integers(6, 36)), pitch))
+            notes.append((onset + twelfth * int(rng.integers(0, 12)), twelfth * int(rng.integers(1, 36)), pitch))
+        elif kind == 3:
+            # Exactly half a beat inside a bucket edge, from either side
+            edge = Fraction(int(rng.integers(8, 2 * length)), 2)
+            outside = Fraction(int(rng.integers(1, 4)), 2)
+            if rng.integers(2):
+                notes.append((edge - Fraction(1, 2), Fraction(1, 2) + outside, pitch))
+            else:
+                notes.append((edge - outside, outside + Fraction(1, 2), pitch))
+        elif kind == 4:
+            # Triplets
+            start = Fraction(int(rng.integers(0, 3 * length)), 3)
+            notes.extend((start + Fraction(k, 3), Fraction(1, 3), pitch + 4 * k) for k in range(3))
+        else:
+            notes.append((twelfth * 3 * int(rng.integers(0, 4 * length)), twelfth * 3 * int(rng.integers(1, 16)), pitch))
+    notes = [(max(onset, Fraction(0)), duration, pitch) for onset, duration, pitch in notes]
+
+    n = len(notes)
+    table = NoteTable(
+        onset=np.array([float(o) for o, _, _ in notes]),
+        duration=np.array([float(d) for _, d, _ in notes]),
+        pitch=np.array([p for _, _, p in notes], dtype=np.uint8),
+        velocity=np.full(n, 70, dtype=np.uint8),
+        channel=np.zeros(n, dtype=np.int8),
+        program=np.zeros(n, dtype=np.uint8),
+    )
+    return table, notes
+
+def reference_table_quantize(notes, beats_per_chord, shift=Fraction(1, 2), start_offset=4):
+    """
+    reference_quantize over exact (onset, duration, pitch) notes, so the 0.5 beat
+    threshold is checked without float rounding.
+    Returns one (offset, mask, root) tuple per chord.
+    """
+    beats_per_chord = Fraction(beats_per_chord)
+    highest_time = max(onset + duration for onset, duration, _ in notes)
+    buckets = []
+    current_offset = Fraction(start_offset)
+    while current_offset <= highest_time:
+        window_start = current_offset + shift
+        window_end = current_offset + beats_per_chord + shift
+        valid = [(onset, pitch) for onset, duration, pitch in notes
+                 if min(onset + duration, window_end) - max(onset, window_start) >= Fraction(1, 2)]
+
+        if valid:
+            earliest_offset = min(onset for onset, _ in valid)
+            anchor_bass = min(pitch for onset, pitch in valid if onset <= earliest_offset + Fraction(1, 2))
+            reduced_pitches = []
+            for pc in sorted(set(pitch % 12 for _, pitch in valid)):
+                p = note.Pitch(pc)
+                p.octave = 3 if pc == anchor_bass % 12 else 4
+                reduced_pitches.append(p)
+            raw_chord = chord.Chord(reduced_pitches)
+            raw_chord.root(next(p for p in reduced_pitches if p.pitchClass == anchor_bass % 12))
+
+            # The root is the anchor the reduction was built on; music21 can
+            # re-infer a different one for dyads like an augmented fifth
+            clean_chord = reference_tertian_chord(raw_chord)
+            buckets.append((float(current_offset), chord_mask(clean_chord), anchor_bass % 12))
+        current_offset += beats_per_chord
+    return buckets
+
+def timeline_buckets(timeline):
+    return [(float(o), int(m), int(r)) for o, m, r in zip(timeline.offsets, timeline.pc_mask, timeline.root_pc)]
+
+def verify_generated_tables():
+    print(f"Checking generated note tables (seeds {TABLE_SEEDS[0]}-{TABLE_SEEDS[-1]})...")
+    ok = True
+    for seed in TABLE_SEEDS:
+        table, notes = generate_note_table(seed)
+        multi = quantize_harmony_multi(table, TABLE_RESOLUTIONS, as_timeline=True)
+        for beats_per_chord in TABLE_RESOLUTIONS:
+            expected = reference_table_quantize(notes, beats_per_chord)
+            ok &= compare(f"seed {seed}, {beats_per_chord:g}-beat quantize_harmony", expected,
+                          timeline_buckets(quantize_harmony(table, beats_per_chord, as_timeline=True)))
+            ok &= compare(f"seed {seed}, {beats_per_chord:g}-beat quantize_harmony_multi", expected,
+                          timeline_buckets(multi[beats_per_chord]))
+    return ok
+
+def _bucket(offset, duration, c, symbol):
+    return (float(offset), float(duration), tuple(sorted(p.midi for p in c.pitches)), c.root().pitchClass, symbol)
+
+def part_buckets(part):
+    return [_bucket(c.offset, c.quarterLength, c, getattr(c, 'chord_symbol_figure', None))
+            for c in part.getElementsByClass('Chord')]
+
+def compare(label, expected, found):
+    if expected == found:
+        print(f"  {label}: {len(found)} buckets match")
+        return True
+    mismatches = [(e, f) for e, f in zip(expected, found) if e != f]
+    print(f"  {label}: MISMATCH ({len(expected)} expected, {len(found)} found, {len(mismatches)} differ)")
+    for e, f in mismatches[:5]:
+        print(f"    expected {e}\n    found    {f}")
+    return False
+
+def verify_file(midi_path):
+    print(f"Loading {midi_path}...")
+    score = load_midi(midi_path)
+    if not score or len(score.parts) == 0:
+        print("  Failed to load MIDI.")
+        return False
+
+    ok = True
+    table = NoteTable.from_score(score, midi_path)
+    multi = quantize_harmony_multi(score, RESOLUTIONS)
+    for beats_per_chord in RESOLUTIONS:
+        expected = reference_quantize(score, beats_per_chord)
+        ok &= compare(f"{beats_per_chord:g}-beat quantize_harmony", expected,
+                      part_buckets(quantize_harmony(score, beats_per_chord)))
+        ok &= compare(f"{beats_per_chord:g}-beat quantize_harmony_multi", expected, part_buckets(multi[beats_per_chord]))
+        ok &= compare(f"{beats_per_chord:g}-beat timeline from NoteTable.from_score", expected,
+                      part_buckets(quantize_harmony(table, beats_per_chord, as_timeline=True).to_part()))
+    return ok
+
+def main():
+    paths = sys.argv[1:]
+    tmp_dir = None
+    if not paths:
+        # No files given: check the generated fixture
+        tmp_dir = tempfile.mkdtemp()
+        paths = [os.path.join(tmp_dir, "quantize_fixture.mid")]
+        generate_fixture_midi(paths[0])
+
+    try:
+        ok = all([verify_file(path) for path in paths])
+        if tmp_dir:
+            ok &= verify_generated_tables()
+    finally:
+        if tmp_dir:
+            for f in os.listdir(tmp_dir):
+                os.remove(os.path.join(tmp_dir, f))
+            os.rmdir(tmp_dir)
+
+    if ok:
+        print("Vectorized quantization matches the reference loop.")
+    else:
+        print("Quantization verification failed.")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()